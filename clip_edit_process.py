@@ -2,36 +2,147 @@ from __future__ import annotations
 
 import os
 import json
-import time
+import asyncio
+import inspect
 import shutil
+import hashlib
+import threading
+import concurrent.futures
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Callable, Iterator, Optional, Tuple
 
 from media_utils import (
-    ffprobe_duration,
-    ffprobe_video_size,
+    ffprobe_info,
+    info_duration,
+    info_video_size,
     ffmpeg_escape_text,
     ffmpeg_escape_fontfile,
+    ffmpeg_threads,
     run_ffmpeg,
+    run_ffmpeg_async,
+    safe_filename_from_slug,
 )
-from subs_utils import parse_subs_field, write_srt, generate_ass_from_srt
-from mask_utils import (
-    generate_rounded_mask,
-    generate_rounded_frame_window,
-    PIL_AVAILABLE,
-)
+from subs_utils import parse_subs_field, write_srt, write_ass
+from mask_utils import generate_rounded_frame_window, PIL_AVAILABLE
 from graphics_utils import prepare_logo
 
 DEBUG = os.getenv("MASK_DEBUG", "0") in ("1", "true", "True", "YES", "yes")
 BG_COLOR = os.getenv("BG_COLOR", "black")  # örn: '#0d0d0d' yaparsan köşeler daha net görünür
+# örn: /dev/shm -> outputs are encoded there, so the +faststart moov rewrite runs in RAM,
+# then moved into outputs/<slug>/
+SCRATCH_DIR = os.getenv("CLIPCAFE_SCRATCH_DIR")
 
 def log_debug(*args):
     if DEBUG:
         print("[mask-debug]", *args)
 
-def safe_filename_from_slug(slug: str) -> str:
-    name = slug.replace("/", "_").replace(" ", "_")
-    return "".join(c for c in name if c.isalnum() or c in "-_.").strip("-_") or f"clip_{int(time.time())}"
+def _scratch_path(out_path: Path) -> Path:
+    if not SCRATCH_DIR:
+        return out_path
+    return Path(SCRATCH_DIR) / f"{out_path.stem}.{os.getpid()}.{threading.get_ident()}{out_path.suffix}"
+
+def _publish_outputs(pairs: list[Tuple[Path, Path]], ok: bool) -> Optional[str]:
+    """
+    Move scratch files (see CLIPCAFE_SCRATCH_DIR) to their final path, or drop them on failure.
+    Returns an error message when a move fails (cross-device copy error, disk full), else None;
+    the remaining scratch files are dropped then too.
+    """
+    err = None
+    for tmp_path, out_path in pairs:
+        if tmp_path == out_path:
+            continue
+        if ok and err is None:
+            try:
+                shutil.move(str(tmp_path), str(out_path))
+                continue
+            except Exception as e:
+                err = f"moving {tmp_path} -> {out_path} failed: {e}"
+        try:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        except Exception:
+            pass
+    return err
+
+def _asset_cache_key(*parts) -> str:
+    return hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=12).hexdigest()
+
+def _render_cached(cache_path: Path, render: Callable[[Path], bool]) -> bool:
+    """
+    Render cache_path once (no-op when it already exists).
+    """
+    if not cache_path.exists():
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        # unique tmp name so concurrent workers never see a half-written file
+        tmp_path = cache_path.with_name(
+            f".{cache_path.stem}.{os.getpid()}.{threading.get_ident()}{cache_path.suffix}"
+        )
+        try:
+            if not render(tmp_path) or not tmp_path.exists():
+                return False
+            os.replace(tmp_path, cache_path)
+        except Exception:
+            try:
+                if tmp_path.exists():
+                    tmp_path.unlink()
+            except Exception:
+                pass
+            return False
+    return True
+
+# Process-level memo for batch-stable assets (font dir, logo, rounded frame): key -> shared path under outputs_dir/_cache
+_ASSET_CACHE: dict[tuple, Path] = {}
+
+def _file_key(path: Path) -> Optional[tuple]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return (str(path.resolve()), st.st_mtime_ns, st.st_size)
+
+def _memo_asset(key: tuple, cache_path: Path, render: Callable[[Path], bool]) -> Optional[Path]:
+    hit = _ASSET_CACHE.get(key)
+    if hit is not None and hit.exists():
+        return hit
+    if not _render_cached(cache_path, render):
+        return None
+    _ASSET_CACHE[key] = cache_path
+    return cache_path
+
+def _get_fonts_dir(font_file: str, outputs_dir: Path) -> Optional[Path]:
+    """
+    One shared fontsdir per font file (keyed on path, mtime, size) instead of a copy per clip.
+    The directory holds only that font, so libass doesn't scan anything else.
+    """
+    pf = Path(font_file)
+    fk = _file_key(pf)
+    if fk is None:
+        return None
+    font_path = outputs_dir / "_cache" / f"fonts_{_asset_cache_key(*fk)}" / pf.name
+
+    def _copy(tmp_path: Path) -> bool:
+        shutil.copyfile(str(pf), str(tmp_path))
+        return True
+
+    hit = _memo_asset(("fonts", fk, str(outputs_dir)), font_path, _copy)
+    return hit.parent if hit else None
+
+def _get_logo_path(logo_src: Optional[Path], desired_w: int, opacity: int, outputs_dir: Path) -> Optional[Path]:
+    """
+    Logo PNG scaled/faded once per (source, width, opacity); clips reference the shared file.
+    """
+    fk = _file_key(logo_src) if logo_src else None
+    logo_key = _asset_cache_key("logo", fk or str(logo_src), desired_w, opacity)
+    return _memo_asset(
+        ("logo", logo_key, str(outputs_dir)),
+        outputs_dir / "_cache" / f"logo_{logo_key}.png",
+        lambda p: prepare_logo(
+            p,
+            logo_src=logo_src,
+            desired_width=desired_w,
+            opacity_0_255=opacity,
+        ) is not None
+    )
 
 def _build_vencoder_args(
     video_encoder: str,
@@ -48,6 +159,8 @@ def _build_vencoder_args(
             "-cq", str(int(nvenc_cq)),
             "-b:v", "0",
             "-profile:v", "high",
+            # NVENC's native surface format; avoids a yuv420p planar conversion per frame
+            "-pix_fmt", "nv12",
         ]
         if nvenc_gpu is not None:
             args += ["-gpu", str(int(nvenc_gpu))]
@@ -58,9 +171,185 @@ def _build_vencoder_args(
             "-preset", "veryfast",
             "-crf", "23",
             "-profile:v", "high",
+            "-pix_fmt", "yuv420p",
         ]
 
-def edit_clip(
+def _build_hwdec_args(video_encoder: str, nvenc_gpu: Optional[int]) -> list[str]:
+    """
+    Decode the source on NVDEC when encoding with NVENC.
+    No -hwaccel_output_format: frames are handed back in system memory so the
+    CPU filter graph (libass/drawtext, PNG overlays) keeps working unchanged.
+    """
+    if video_encoder != "h264_nvenc":
+        return []
+    args = ["-hwaccel", "cuda"]
+    if nvenc_gpu is not None:
+        args += ["-hwaccel_device", str(int(nvenc_gpu))]
+    return args
+
+# Feed 1080x1080 (basit yol; istersen buraya da çerçeve+logo ekleyebiliriz)
+_FEED_TRANSFORM = (
+    "scale=1080:-2,"
+    "pad=width='max(1080,iw)':height='max(1080,ih)':x='(ow-iw)/2':y='(oh-ih)/2':color=black,"
+    "crop=1080:1080"
+)
+
+def _vertical_graph(
+    src_label: str,
+    base_transform_snippet: str,
+    text_suffix: str,
+    frame_idx: Optional[int],
+    logo_idx: Optional[int],
+    lx: int,
+    ly: int,
+    out_labels: list[str]
+) -> str:
+    """
+    1080x1920 chain: base transform -> [frame overlay] -> [logo overlay] -> text,
+    ending in one [out_<label>] pad per output (split when there are several).
+    """
+    chain = f"{src_label}{base_transform_snippet}"
+    if frame_idx is not None:
+        chain += f"[vcore];[vcore][{frame_idx}:v]overlay=0:0"
+    if logo_idx is not None:
+        chain += f"[withframe];[withframe][{logo_idx}:v]overlay={lx}:{ly}"
+    chain += text_suffix
+    # Text/frame/logo are rendered once, then fanned out to each 1080x1920 output.
+    # This already gives the "burn subtitles once" saving without an intermediate
+    # file (which would cost an extra lossy encode); only the feed, with its own
+    # 1080x1080 geometry, runs libass a second time.
+    pads = "".join(f"[out_{label}]" for label in out_labels)
+    if len(out_labels) > 1:
+        return f"{chain},split={len(out_labels)}{pads}"
+    return f"{chain}{pads}"
+
+def _feed_graph(src_label: str, text_suffix: str) -> str:
+    return f"{src_label}{_FEED_TRANSFORM}{text_suffix}[out_feed]"
+
+def _output_args(out_path: Path, venc_args: list[str], threads: int, map_args: list[str]) -> list[str]:
+    return [
+        *map_args,
+        *venc_args, "-threads", str(int(threads)), "-movflags", "+faststart",
+        "-c:a", "aac", "-b:a", "128k",
+        str(out_path)
+    ]
+
+def _clip_range(src: dict, dur: float) -> Optional[Tuple[float, float]]:
+    """
+    Optional (start, end) from the clip.cafe src fields start_s/end_s, clamped to the
+    probed duration. None when absent/invalid or when it covers the whole file.
+    """
+    try:
+        start = float(src.get("start_s") or 0.0)
+        end = float(src.get("end_s")) if src.get("end_s") is not None else dur
+    except (TypeError, ValueError):
+        return None
+    start = max(0.0, start)
+    end = min(end, dur)
+    if end <= start or (start == 0.0 and end >= dur):
+        return None
+    return start, end
+
+# Text suffix (applied at the end of each output chain)
+def _build_text_suffix(use_ass_local: bool,
+                       ass_path_local: Optional[Path],
+                       srt_path_local: Optional[Path],
+                       drawtext_local: Optional[str],
+                       fonts_dir_local: Optional[Path],
+                       font_family_local: str,
+                       subtitle_size_local: int,
+                       subtitle_margin_local: int) -> str:
+    parts = []
+    if drawtext_local:
+        parts.append(drawtext_local)
+    if use_ass_local and ass_path_local and ass_path_local.exists():
+        if fonts_dir_local:
+            parts.append(f"subtitles={ass_path_local.as_posix()}:fontsdir={fonts_dir_local.as_posix()}")
+        else:
+            parts.append(f"ass={ass_path_local.as_posix()}")
+    else:
+        if srt_path_local and srt_path_local.exists():
+            force_style = f"FontName={font_family_local},FontSize={subtitle_size_local},Alignment=2,MarginV={subtitle_margin_local},PrimaryColour=&H00FFFFFF&,Outline=1,Shadow=0"
+            if fonts_dir_local:
+                parts.append(f"subtitles={srt_path_local.as_posix()}:force_style='{force_style}':fontsdir={fonts_dir_local.as_posix()}")
+            else:
+                parts.append(f"subtitles={srt_path_local.as_posix()}:force_style='{force_style}'")
+    return ("," + ",".join(parts)) if parts else ""
+
+def _build_render_cmd(
+    ffmpeg_cmd: str,
+    video_path: Path,
+    hwdec_args: list[str],
+    venc_args: list[str],
+    threads: int,
+    base_transform_snippet: str,
+    text_suffix: str,
+    frame_path: Optional[Path],
+    logo_path: Optional[Path],
+    lx: int,
+    ly: int,
+    vertical_outputs: list[Tuple[Path, str]],
+    feed_out: Optional[Path],
+    watermark_path: Optional[Path] = None,
+    clip_range: Optional[Tuple[float, float]] = None
+) -> list[str]:
+    """
+    Single ffmpeg invocation: the source is decoded once and the filter graph is
+    split into the 1080x1920 (instagram post / reels) and 1080x1080 (feed) outputs.
+    vertical_outputs: [(out_path, label), ...] -> [out_<label>] pad in the graph.
+    watermark_path: overlaid at 10:10 on the "reels" branch only, inside the same graph.
+    clip_range: (start, end) input-side seek; -copyts keeps source timestamps so the
+    subtitle/ASS timings still line up, outputs are shifted back to zero.
+    """
+    # Inputs: 0=video, then frame, then logo, then watermark
+    extra_inputs = [p for p in (frame_path, logo_path) if p]
+    frame_idx = 1 if frame_path else None
+    logo_idx = len(extra_inputs) if logo_path else None
+    wm_idx = None
+    vertical_labels = [label for _, label in vertical_outputs]
+    if watermark_path and "reels" in vertical_labels:
+        extra_inputs.append(watermark_path)
+        wm_idx = len(extra_inputs)
+        vertical_labels[vertical_labels.index("reels")] = "reels_pre"
+
+    if vertical_outputs and feed_out:
+        graph = ["[0:v]split=2[src_vert][src_feed]"]
+        src_vert, src_feed = "[src_vert]", "[src_feed]"
+    else:
+        graph = []
+        src_vert = src_feed = "[0:v]"
+    outputs = list(vertical_outputs)
+    if vertical_outputs:
+        graph.append(_vertical_graph(
+            src_vert, base_transform_snippet, text_suffix, frame_idx, logo_idx, lx, ly,
+            vertical_labels
+        ))
+        if wm_idx is not None:
+            graph.append(f"[out_reels_pre][{wm_idx}:v]overlay=10:10[out_reels]")
+    if feed_out:
+        graph.append(_feed_graph(src_feed, text_suffix))
+        outputs.append((feed_out, "feed"))
+
+    n = str(int(threads))
+    seek_args = []
+    ts_args = []
+    if clip_range:
+        seek_args = ["-ss", f"{clip_range[0]:.3f}", "-to", f"{clip_range[1]:.3f}"]
+        ts_args = ["-avoid_negative_ts", "make_zero"]
+    cmd = [
+        ffmpeg_cmd, "-y",
+        "-filter_threads", n, "-filter_complex_threads", n,
+        *(["-copyts"] if clip_range else []),
+        *hwdec_args, "-threads", n, *seek_args, "-i", str(video_path)
+    ]
+    for p in extra_inputs:
+        cmd += ["-i", str(p)]
+    cmd += ["-filter_complex", ";".join(graph)]
+    for out_path, label in outputs:
+        cmd += _output_args(out_path, venc_args, threads, ["-map", f"[out_{label}]", "-map", "0:a?", *ts_args])
+    return cmd
+
+def _plan_edit(
     video_path: Path,
     src: dict,
     min_duration: int,
@@ -86,18 +375,28 @@ def edit_clip(
     nvenc_preset: str = "p5",
     nvenc_cq: int = 23,
     nvenc_gpu: Optional[int] = None,
+    # ffmpeg thread budget (defaults to ffmpeg_threads(1) / CLIPCAFE_FFMPEG_THREADS)
+    threads_per_invocation: Optional[int] = None,
     # Logo params
     logo_path: Optional[str] = None,
     logo_size_ratio: float = 0.15,  # logo width as fraction of video content width
     logo_margin: int = 16,          # px from video area's top-left
-    logo_opacity: int = 200         # 0-255
+    logo_opacity: int = 200,        # 0-255
+    # prefetched ffprobe_info result (e.g. from ffprobe_info_batch); probed here when None
+    probe: Optional[dict] = None
 ) -> Tuple[bool, dict]:
     slug_raw = src.get("slug") or src.get("title") or video_path.stem
     slug = safe_filename_from_slug(slug_raw)
 
-    dur = ffprobe_duration(video_path, ffprobe_cmd)
+    if probe is None:
+        probe = ffprobe_info(video_path, ffprobe_cmd)
+    dur = info_duration(probe)
     if dur is None:
         return False, {"error": "ffprobe missing or failed", "slug": slug}
+    # Only decode the highlight when the src carries start_s/end_s
+    clip_range = _clip_range(src, dur)
+    if clip_range:
+        dur = clip_range[1] - clip_range[0]
     if dur < min_duration:
         return False, {"error": f"duration_too_short ({dur})", "slug": slug, "duration": dur}
 
@@ -111,37 +410,27 @@ def edit_clip(
 
     subs_field = src.get("subtitles") or src.get("captions") or ""
     subs = parse_subs_field(subs_field) if subs_field else []
-    srt_path = downloads_dir / f"{slug}.srt"
+    srt_path: Optional[Path] = None  # only written if the ASS can't be
     ass_path = downloads_dir / f"{slug}.ass"
-    if subs:
-        write_srt(subs, srt_path)
-    else:
-        srt_path = None
 
     clip_out = outputs_dir / slug
     clip_out.mkdir(parents=True, exist_ok=True)
     insta_post = clip_out / f"{slug}_instagram_1080x1920.mp4"
     feed_out = clip_out / f"{slug}_feed_1080x1080.mp4" if produce_feed else None
     reels_out = clip_out / f"{slug}_reels_1080x1920.mp4" if produce_reels else None
+    if produce_reels and watermark:
+        if not watermark.exists():
+            return False, {"error": f"watermark not found: {watermark}", "slug": slug}
+        # watermark is composited in the main render, so reels are encoded once, already marked
+        reels_out = clip_out / f"{slug}_reels_wm.mp4"
 
-    fonts_dir = None
-    if font_file:
-        pf = Path(font_file)
-        if pf.exists():
-            fonts_dir = clip_out / "fonts"
-            fonts_dir.mkdir(parents=True, exist_ok=True)
-            try:
-                shutil.copy(str(pf), str(fonts_dir / pf.name))
-            except Exception:
-                fonts_dir = None
-        else:
-            fonts_dir = None
+    fonts_dir = _get_fonts_dir(font_file, outputs_dir) if font_file else None
 
     # Layout: compute video content region inside 1080x1920
     side_margin = max(0, int(side_margin))
     target_width = max(16, 1080 - 2 * side_margin)
 
-    orig_size = ffprobe_video_size(video_path, ffprobe_cmd)
+    orig_size = info_video_size(probe)
     if orig_size:
         orig_w, orig_h = orig_size
         try:
@@ -159,54 +448,54 @@ def edit_clip(
     gap = int(title_margin_top) if title_margin_top is not None else 80
     title_pos_y = max(6, video_top_val - gap)
 
-    # ASS generation (subtitles + optional title)
+    # Timestamps stay on the source timeline (-copyts), so the title must last until the range end
+    title_end = clip_range[1] if clip_range else dur
+
+    # ASS written straight from the parsed subs (subtitles + optional title); the SRT+force_style
+    # path is only a fallback. The .ass is keyed on its inputs, so a rerun of the same clip reuses it.
     use_ass = False
-    if srt_path:
-        ass_ok, _ = generate_ass_from_srt(
-            srt_path, ass_path, font=font_family,
-            size=subtitle_size, marginv=subtitle_margin, marginl=side_margin, marginr=side_margin,
-            title_text=title_text if title_text else None,
-            title_size=title_size if title_size else subtitle_size,
-            title_pos_y=title_pos_y,
-            duration_s=dur
+    if subs:
+        ass_key = _asset_cache_key(
+            "ass", 2, subs, font_family, subtitle_size, subtitle_margin, side_margin,
+            title_text, title_size, title_pos_y, title_end
         )
+        ass_key_path = ass_path.with_suffix(".ass.key")
+        try:
+            ass_ok = ass_path.exists() and ass_key_path.read_text(encoding="utf-8") == ass_key
+        except OSError:
+            ass_ok = False
+        if not ass_ok:
+            try:
+                ass_key_path.unlink()
+            except OSError:
+                pass
+            ass_ok, _ = write_ass(
+                subs, ass_path, font=font_family,
+                size=subtitle_size, marginv=subtitle_margin, marginl=side_margin, marginr=side_margin,
+                title_text=title_text if title_text else None,
+                title_size=title_size if title_size else subtitle_size,
+                title_pos_y=title_pos_y,
+                duration_s=title_end
+            )
+            if ass_ok:
+                ass_key_path.write_text(ass_key, encoding="utf-8")
         if ass_ok:
             use_ass = True
         else:
             ass_path = None
+            srt_path = write_srt(subs, downloads_dir / f"{slug}.srt")
 
     # Base video (no text)
-    base_transform_snippet = (
-        f"scale={target_width}:-2,"
-        "pad=width='max(1080,iw)':height='max(1920,ih)':x='(ow-iw)/2':y='(oh-ih)/2':color=black,"
-        "crop=1080:1920"
-    )
-
-    # Text suffix (applied at the end)
-    def build_text_suffix(use_ass_local: bool,
-                          ass_path_local: Optional[Path],
-                          srt_path_local: Optional[Path],
-                          drawtext_local: Optional[str],
-                          fonts_dir_local: Optional[Path],
-                          font_family_local: str,
-                          subtitle_size_local: int,
-                          subtitle_margin_local: int) -> str:
-        parts = []
-        if drawtext_local:
-            parts.append(drawtext_local)
-        if use_ass_local and ass_path_local and ass_path_local.exists():
-            if fonts_dir_local:
-                parts.append(f"subtitles={ass_path_local.as_posix()}:fontsdir={fonts_dir_local.as_posix()}")
-            else:
-                parts.append(f"ass={ass_path_local.as_posix()}")
-        else:
-            if srt_path_local and srt_path_local.exists():
-                force_style = f"FontName={font_family_local},FontSize={subtitle_size_local},Alignment=2,MarginV={subtitle_margin_local},PrimaryColour=&H00FFFFFF&,Outline=1,Shadow=0"
-                if fonts_dir_local:
-                    parts.append(f"subtitles={srt_path_local.as_posix()}:force_style='{force_style}':fontsdir={fonts_dir_local.as_posix()}")
-                else:
-                    parts.append(f"subtitles={srt_path_local.as_posix()}:force_style='{force_style}'")
-        return ("," + ",".join(parts)) if parts else ""
+    # Full-width source taller than the canvas: pad would be a no-op full-frame copy, crop alone is enough.
+    # (2px slack: ffmpeg's -2 rounding may differ from scaled_h by one line)
+    if target_width == 1080 and scaled_h and scaled_h >= 1920 + 2:
+        base_transform_snippet = f"scale={target_width}:-2,crop=1080:1920"
+    else:
+        base_transform_snippet = (
+            f"scale={target_width}:-2,"
+            "pad=width='max(1080,iw)':height='max(1920,ih)':x='(ow-iw)/2':y='(oh-ih)/2':color=black,"
+            "crop=1080:1920"
+        )
 
     drawtext_filter = None
     if (not use_ass) and title_text:
@@ -219,13 +508,13 @@ def edit_clip(
         else:
             drawtext_filter = f"drawtext=font='Roboto':text='{txt}':fontsize={tsize}:fontcolor=white:x=(w-text_w)/2:y={y_pos}:box=1:boxcolor=black@0.5:boxborderw=5"
 
-    text_suffix = build_text_suffix(
+    text_suffix = _build_text_suffix(
         use_ass, ass_path, srt_path, drawtext_filter, fonts_dir, font_family, subtitle_size, subtitle_margin
     )
 
     # Fast rounded frame (window) path
     use_frame = False
-    frame_path = clip_out / "frame_1080x1920.png"
+    frame_path: Optional[Path] = None
     if corner_radius and corner_radius > 0 and PIL_AVAILABLE and scaled_h and scaled_h > 0:
         video_left = (1080 - target_width) // 2
         x0 = max(0, min(1079, int(video_left)))
@@ -235,332 +524,148 @@ def edit_clip(
         max_radius = min((x1 - x0) // 2, (y1 - y0) // 2)
         radius_use = max(0, min(int(corner_radius), max_radius)) if max_radius > 0 else 0
         if radius_use > 0:
-            ok_frame = generate_rounded_frame_window(
-                frame_path, 1080, 1920, x0, y0, x1, y1, radius_use, bg_color=BG_COLOR
+            # same canvas/rect/radius/bg for the whole batch: every clip overlays the one shared PNG
+            frame_key = _asset_cache_key("frame", 1080, 1920, x0, y0, x1, y1, radius_use, BG_COLOR)
+            frame_path = _memo_asset(
+                ("frame", frame_key, str(outputs_dir)),
+                outputs_dir / "_cache" / f"frame_{frame_key}.png",
+                lambda p: generate_rounded_frame_window(
+                    p, 1080, 1920, x0, y0, x1, y1, radius_use, bg_color=BG_COLOR
+                )
             )
-            use_frame = bool(ok_frame and frame_path.exists())
+            use_frame = frame_path is not None
             log_debug("frame_window", "rect", (x0, y0, x1, y1), "radius", radius_use, "ok", use_frame)
         else:
             log_debug("radius_use=0; frame skipped")
 
-    # Fall back to (slower) alpha mask if frame not used
-    use_mask = False
-    mask_path = clip_out / "mask_1080x1920.png"
-    if (not use_frame) and corner_radius and corner_radius > 0 and PIL_AVAILABLE and scaled_h and scaled_h > 0:
-        video_left = (1080 - target_width) // 2
-        x0 = video_left
-        y0 = video_top_val
-        x1 = video_left + target_width
-        y1 = video_top_val + scaled_h
-        x0 = max(0, min(1079, int(x0)))
-        y0 = max(0, min(1919, int(y0)))
-        x1 = max(1, min(1080, int(x1)))
-        y1 = max(1, min(1920, int(y1)))
-        max_radius = min((x1 - x0) // 2, (y1 - y0) // 2)
-        radius_use = max(0, min(int(corner_radius), max_radius)) if max_radius > 0 else 0
-        if radius_use > 0:
-            if generate_rounded_mask(mask_path, 1080, 1920, x0, y0, x1, y1, radius_use):
-                use_mask = True
-
     # Prepare logo (dummy or provided), scaled relative to content width
     logo_ready_path: Optional[Path] = None
     try:
         if logo_size_ratio and logo_size_ratio > 0:
             desired_logo_w = max(8, int(round(target_width * float(logo_size_ratio))))
             logo_src = Path(logo_path) if logo_path else None
-            logo_ready_path = prepare_logo(
-                clip_out / "logo_rgba.png",
-                logo_src=logo_src,
-                desired_width=desired_logo_w,
-                opacity_0_255=int(logo_opacity),
-            )
+            logo_ready_path = _get_logo_path(logo_src, desired_logo_w, int(logo_opacity), outputs_dir)
     except Exception:
         logo_ready_path = None
 
     # Encoder args
     venc_args = _build_vencoder_args(video_encoder, nvenc_preset, nvenc_cq, nvenc_gpu)
+    hwdec_args = _build_hwdec_args(video_encoder, nvenc_gpu)
+    threads = threads_per_invocation or ffmpeg_threads(1)
 
     # Overlay coords for logo (relative to video area)
     video_left = (1080 - target_width) // 2
     lx = int(video_left + max(0, int(logo_margin)))
     ly = int(video_top_val + max(0, int(logo_margin)))
 
-    # 1) Instagram 1080x1920
-    if use_frame and frame_path.exists():
-        if logo_ready_path and logo_ready_path.exists():
-            # Inputs: 0=video, 1=frame, 2=logo
-            filter_complex = (
-                f"[0:v]{base_transform_snippet}[vcore];"
-                f"[vcore][1:v]overlay=0:0[withframe];"
-                f"[withframe][2:v]overlay={lx}:{ly}"
-                f"{text_suffix}"
-                f"[final]"
-            )
-            cmd_insta = [
-                ffmpeg_cmd, "-y",
-                "-i", str(video_path),
-                "-i", str(frame_path),
-                "-i", str(logo_ready_path),
-                "-filter_complex", filter_complex,
-                "-map", "[final]", "-map", "0:a?",
-                *venc_args, "-pix_fmt", "yuv420p", "-movflags", "+faststart",
-                "-c:a", "aac", "-b:a", "128k",
-                str(insta_post)
-            ]
-        else:
-            filter_complex = (
-                f"[0:v]{base_transform_snippet}[vcore];"
-                f"[vcore][1:v]overlay=0:0"
-                f"{text_suffix}"
-                f"[final]"
-            )
-            cmd_insta = [
-                ffmpeg_cmd, "-y",
-                "-i", str(video_path),
-                "-i", str(frame_path),
-                "-filter_complex", filter_complex,
-                "-map", "[final]", "-map", "0:a?",
-                *venc_args, "-pix_fmt", "yuv420p", "-movflags", "+faststart",
-                "-c:a", "aac", "-b:a", "128k",
-                str(insta_post)
-            ]
-    elif use_mask and mask_path.exists():
-        if logo_ready_path and logo_ready_path.exists():
-            # Inputs: 0=video, 1=mask, 2=logo
-            filter_complex = (
-                f"[0:v]{base_transform_snippet},format=rgba[vcore];"
-                f"[1:v]scale=1080:1920,format=rgba,alphaextract[ma];"
-                f"[vcore][ma]alphamerge[va];"
-                f"color=c={BG_COLOR}:s=1080x1920[bg];"
-                f"[bg][va]overlay=format=auto[masked];"
-                f"[masked][2:v]overlay={lx}:{ly}"
-                f"{text_suffix}"
-                f"[final]"
-            )
-            cmd_insta = [
-                ffmpeg_cmd, "-y",
-                "-i", str(video_path),
-                "-i", str(mask_path),
-                "-i", str(logo_ready_path),
-                "-filter_complex", filter_complex,
-                "-map", "[final]", "-map", "0:a?",
-                *venc_args, "-pix_fmt", "yuv420p", "-movflags", "+faststart",
-                "-c:a", "aac", "-b:a", "128k",
-                str(insta_post)
-            ]
-        else:
-            filter_complex = (
-                f"[0:v]{base_transform_snippet},format=rgba[vcore];"
-                f"[1:v]scale=1080:1920,format=rgba,alphaextract[ma];"
-                f"[vcore][ma]alphamerge[va];"
-                f"color=c={BG_COLOR}:s=1080x1920[bg];"
-                f"[bg][va]overlay=format=auto"
-                f"{text_suffix}"
-                f"[final]"
-            )
-            cmd_insta = [
-                ffmpeg_cmd, "-y",
-                "-i", str(video_path),
-                "-i", str(mask_path),
-                "-filter_complex", filter_complex,
-                "-map", "[final]", "-map", "0:a?",
-                *venc_args, "-pix_fmt", "yuv420p", "-movflags", "+faststart",
-                "-c:a", "aac", "-b:a", "128k",
-                str(insta_post)
-            ]
-    else:
-        # no frame/mask
-        if logo_ready_path and logo_ready_path.exists():
-            # Inputs: 0=video, 1=logo
-            filter_complex = (
-                f"[0:v]{base_transform_snippet}[vcore];"
-                f"[vcore][1:v]overlay={lx}:{ly}"
-                f"{text_suffix}"
-                f"[final]"
-            )
-            cmd_insta = [
-                ffmpeg_cmd, "-y",
-                "-i", str(video_path),
-                "-i", str(logo_ready_path),
-                "-filter_complex", filter_complex,
-                "-map", "[final]", "-map", "0:a?",
-                *venc_args, "-pix_fmt", "yuv420p", "-movflags", "+faststart",
-                "-c:a", "aac", "-b:a", "128k",
-                str(insta_post)
-            ]
-        else:
-            vf_final = f"{base_transform_snippet}{text_suffix}"
-            cmd_insta = [
-                ffmpeg_cmd, "-y",
-                "-i", str(video_path),
-                "-vf", vf_final,
-                *venc_args, "-pix_fmt", "yuv420p", "-movflags", "+faststart",
-                "-c:a", "aac", "-b:a", "128k",
-                str(insta_post)
-            ]
-
-    ok, err = run_ffmpeg(cmd_insta)
-    if not ok:
-        return False, {"error": f"ffmpeg instagram_post failed: {err}", "slug": slug}
-
-    # 2) Feed 1080x1080 (basit yol; istersen buraya da çerçeve+logo ekleyebiliriz)
-    if produce_feed:
-        vf_feed = (
-            "scale=1080:-2,"
-            "pad=width='max(1080,iw)':height='max(1080,ih)':x='(ow-iw)/2':y='(oh-ih)/2':color=black,"
-            "crop=1080:1080"
-        )
-        feed_chain = f"{vf_feed}{text_suffix}"
-        cmd_feed = [
-            ffmpeg_cmd, "-y",
-            "-i", str(video_path),
-            "-vf", feed_chain,
-            *venc_args, "-pix_fmt", "yuv420p", "-movflags", "+faststart",
-            "-c:a", "aac", "-b:a", "128k",
-            str(feed_out)
-        ]
-        ok, err = run_ffmpeg(cmd_feed)
-        if not ok:
-            return False, {"error": f"ffmpeg feed failed: {err}", "slug": slug}
+    frame_in = frame_path if use_frame and frame_path.exists() else None
+    logo_in = logo_ready_path if logo_ready_path and logo_ready_path.exists() else None
 
-    # 3) Reels 1080x1920 (aynı mantık, logo dahil)
+    # 1) Instagram 1080x1920, 2) Feed 1080x1080, 3) Reels 1080x1920 -- single ffmpeg pass
+    scratch = [(_scratch_path(insta_post), insta_post)]
+    vertical_outputs = [(scratch[0][0], "instagram_post")]
     if produce_reels:
-        if use_frame and frame_path.exists():
-            if logo_ready_path and logo_ready_path.exists():
-                filter_complex = (
-                    f"[0:v]{base_transform_snippet}[vcore];"
-                    f"[vcore][1:v]overlay=0:0[withframe];"
-                    f"[withframe][2:v]overlay={lx}:{ly}"
-                    f"{text_suffix}"
-                    f"[final]"
-                )
-                cmd_reels = [
-                    ffmpeg_cmd, "-y",
-                    "-i", str(video_path),
-                    "-i", str(frame_path),
-                    "-i", str(logo_ready_path),
-                    "-filter_complex", filter_complex,
-                    "-map", "[final]", "-map", "0:a?",
-                    *venc_args, "-pix_fmt", "yuv420p", "-movflags", "+faststart",
-                    "-c:a", "aac", "-b:a", "128k",
-                    str(reels_out)
-                ]
-            else:
-                filter_complex = (
-                    f"[0:v]{base_transform_snippet}[vcore];"
-                    f"[vcore][1:v]overlay=0:0"
-                    f"{text_suffix}"
-                    f"[final]"
-                )
-                cmd_reels = [
-                    ffmpeg_cmd, "-y",
-                    "-i", str(video_path),
-                    "-i", str(frame_path),
-                    "-filter_complex", filter_complex,
-                    "-map", "[final]", "-map", "0:a?",
-                    *venc_args, "-pix_fmt", "yuv420p", "-movflags", "+faststart",
-                    "-c:a", "aac", "-b:a", "128k",
-                    str(reels_out)
-                ]
-        elif use_mask and mask_path.exists():
-            if logo_ready_path and logo_ready_path.exists():
-                filter_complex = (
-                    f"[0:v]{base_transform_snippet},format=rgba[vcore];"
-                    f"[1:v]scale=1080:1920,format=rgba,alphaextract[ma];"
-                    f"[vcore][ma]alphamerge[va];"
-                    f"color=c={BG_COLOR}:s=1080x1920[bg];"
-                    f"[bg][va]overlay=format=auto[masked];"
-                    f"[masked][2:v]overlay={lx}:{ly}"
-                    f"{text_suffix}"
-                    f"[final]"
-                )
-                cmd_reels = [
-                    ffmpeg_cmd, "-y",
-                    "-i", str(video_path),
-                    "-i", str(mask_path),
-                    "-i", str(logo_ready_path),
-                    "-filter_complex", filter_complex,
-                    "-map", "[final]", "-map", "0:a?",
-                    *venc_args, "-pix_fmt", "yuv420p", "-movflags", "+faststart",
-                    "-c:a", "aac", "-b:a", "128k",
-                    str(reels_out)
-                ]
-            else:
-                filter_complex = (
-                    f"[0:v]{base_transform_snippet},format=rgba[vcore];"
-                    f"[1:v]scale=1080:1920,format=rgba,alphaextract[ma];"
-                    f"[vcore][ma]alphamerge[va];"
-                    f"color=c={BG_COLOR}:s=1080x1920[bg];"
-                    f"[bg][va]overlay=format=auto"
-                    f"{text_suffix}"
-                    f"[final]"
-                )
-                cmd_reels = [
-                    ffmpeg_cmd, "-y",
-                    "-i", str(video_path),
-                    "-i", str(mask_path),
-                    "-filter_complex", filter_complex,
-                    "-map", "[final]", "-map", "0:a?",
-                    *venc_args, "-pix_fmt", "yuv420p", "-movflags", "+faststart",
-                    "-c:a", "aac", "-b:a", "128k",
-                    str(reels_out)
-                ]
-        else:
-            if logo_ready_path and logo_ready_path.exists():
-                filter_complex = (
-                    f"[0:v]{base_transform_snippet}[vcore];"
-                    f"[vcore][1:v]overlay={lx}:{ly}"
-                    f"{text_suffix}"
-                    f"[final]"
-                )
-                cmd_reels = [
-                    ffmpeg_cmd, "-y",
-                    "-i", str(video_path),
-                    "-i", str(logo_ready_path),
-                    "-filter_complex", filter_complex,
-                    "-map", "[final]", "-map", "0:a?",
-                    *venc_args, "-pix_fmt", "yuv420p", "-movflags", "+faststart",
-                    "-c:a", "aac", "-b:a", "128k",
-                    str(reels_out)
-                ]
-            else:
-                vf_reels_final = f"{base_transform_snippet}{text_suffix}"
-                cmd_reels = [
-                    ffmpeg_cmd, "-y",
-                    "-i", str(video_path),
-                    "-vf", vf_reels_final,
-                    *venc_args, "-pix_fmt", "yuv420p", "-movflags", "+faststart",
-                    "-c:a", "aac", "-b:a", "128k",
-                    str(reels_out)
-                ]
-
-        ok, err = run_ffmpeg(cmd_reels)
-        if not ok:
-            return False, {"error": f"ffmpeg reels failed: {err}", "slug": slug}
-
-        if watermark:
-            if not watermark.exists():
-                return False, {"error": f"watermark not found: {watermark}", "slug": slug}
-            reels_wm = clip_out / f"{slug}_reels_wm.mp4"
-            cmd_wm = [
-                ffmpeg_cmd, "-y",
-                "-i", str(reels_out), "-i", str(watermark),
-                "-filter_complex", "overlay=10:10",
-                *venc_args, "-pix_fmt", "yuv420p", "-movflags", "+faststart",
-                "-c:a", "aac", "-b:a", "128k",
-                str(reels_wm)
-            ]
-            ok, err = run_ffmpeg(cmd_wm)
-            if not ok:
-                return False, {"error": f"ffmpeg watermark failed: {err}", "slug": slug}
-
+        scratch.append((_scratch_path(reels_out), reels_out))
+        vertical_outputs.append((scratch[-1][0], "reels"))
+    feed_tmp = None
+    if produce_feed:
+        feed_tmp = _scratch_path(feed_out)
+        scratch.append((feed_tmp, feed_out))
+    cmd_render = _build_render_cmd(
+        ffmpeg_cmd, video_path, hwdec_args, venc_args, threads, base_transform_snippet, text_suffix,
+        frame_in, logo_in, lx, ly,
+        vertical_outputs, feed_tmp,
+        watermark_path=watermark if produce_reels else None,
+        clip_range=clip_range
+    )
     return True, {
-        "slug": slug,
-        "duration": dur,
-        "outputs": {
-            "instagram_post": str(insta_post),
-            "feed": str(feed_out) if produce_feed else None,
-            "reels": str(reels_out) if produce_reels else None
-        },
-        "meta": str(downloads_dir / f"{slug}.json")
-    }
\ No newline at end of file
+        "cmd": cmd_render,
+        "scratch": scratch,
+        "labels": [label for _, label in vertical_outputs] + (["feed"] if produce_feed else []),
+        "result": {
+            "slug": slug,
+            "duration": dur,
+            "outputs": {
+                "instagram_post": str(insta_post),
+                "feed": str(feed_out) if produce_feed else None,
+                "reels": str(reels_out) if produce_reels else None
+            },
+            "meta": str(downloads_dir / f"{slug}.json")
+        }
+    }
+
+def _finish_edit(plan: dict, ok: bool, err) -> Tuple[bool, dict]:
+    publish_err = _publish_outputs(plan["scratch"], ok)
+    if not ok:
+        return False, {"error": f"ffmpeg {'/'.join(plan['labels'])} failed: {err}", "slug": plan["result"]["slug"]}
+    if publish_err:
+        return False, {"error": publish_err, "slug": plan["result"]["slug"]}
+    return True, plan["result"]
+
+# edit_clip / edit_clip_async forward to _plan_edit, whose parameter list is the single definition;
+# __signature__ (set below) makes help()/inspect show it on both.
+def edit_clip(video_path: Path, src: dict, *args, **kwargs) -> Tuple[bool, dict]:
+    """
+    Prepare assets for one clip and render it with a single (blocking) ffmpeg run.
+    """
+    ok, plan = _plan_edit(video_path, src, *args, **kwargs)
+    if not ok:
+        return ok, plan
+    return _finish_edit(plan, *run_ffmpeg(plan["cmd"]))
+
+async def edit_clip_async(
+    video_path: Path,
+    src: dict,
+    *args,
+    on_progress: Optional[Callable[[dict], None]] = None,
+    cpus: Optional[list[int]] = None,
+    **kwargs
+) -> Tuple[bool, dict]:
+    """
+    edit_clip for an asyncio event loop: the (small) PIL/subtitle preparation runs in a thread,
+    ffmpeg runs as an asyncio subprocess, so one loop thread can drive many concurrent encodes.
+    on_progress/cpus are passed to run_ffmpeg_async.
+    """
+    # bad arguments raise here, in the caller, not later inside the worker thread
+    _EDIT_SIGNATURE.bind(video_path, src, *args, **kwargs)
+    ok, plan = await asyncio.to_thread(_plan_edit, video_path, src, *args, **kwargs)
+    if not ok:
+        return ok, plan
+    ok, err = await run_ffmpeg_async(plan["cmd"], on_progress=on_progress, cpus=cpus)
+    return _finish_edit(plan, ok, err)
+
+_EDIT_SIGNATURE = inspect.signature(_plan_edit)
+edit_clip.__signature__ = _EDIT_SIGNATURE
+edit_clip_async.__signature__ = _EDIT_SIGNATURE.replace(parameters=[
+    *_EDIT_SIGNATURE.parameters.values(),
+    inspect.Parameter("on_progress", inspect.Parameter.KEYWORD_ONLY, default=None,
+                      annotation="Optional[Callable[[dict], None]]"),
+    inspect.Parameter("cpus", inspect.Parameter.KEYWORD_ONLY, default=None, annotation="Optional[list[int]]"),
+])
+
+def batch_edit(
+    clips: list[Tuple[Path, dict]],
+    *edit_args,
+    max_workers: Optional[int] = None,
+    **edit_kwargs
+) -> Iterator[Tuple[bool, dict]]:
+    """
+    Run edit_clip over many (video_path, src) or (video_path, src, probe) tuples in a process pool.
+    Worker count: max_workers or CLIPCAFE_BATCH_WORKERS (default 4); unless given,
+    threads_per_invocation is set to cpu_count // workers so ffmpeg jobs don't oversubscribe.
+    edit_args/edit_kwargs are forwarded to edit_clip after (video_path, src).
+    Yields (ok, info) as clips finish.
+    """
+    workers = max(1, int(max_workers or os.getenv("CLIPCAFE_BATCH_WORKERS", "4")))
+    edit_kwargs.setdefault("threads_per_invocation", ffmpeg_threads(workers))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as exe:
+        futures = {
+            exe.submit(edit_clip, video_path, src, *edit_args,
+                       **edit_kwargs, **({"probe": probe[0]} if probe else {})): video_path
+            for video_path, src, *probe in clips
+        }
+        for fut in concurrent.futures.as_completed(futures):
+            try:
+                yield fut.result()
+            except Exception as e:
+                yield False, {"error": f"worker exception: {e}", "video": str(futures[fut])}
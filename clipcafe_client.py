@@ -5,6 +5,8 @@ import sys
 import json
 import shutil
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pathlib import Path
 from typing import Optional, Tuple
 
@@ -15,17 +17,51 @@ try:
 except Exception:
     pass
 
+# optional fast JSON decoder for search responses
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
 BASE_URL = "https://api.clip.cafe/"
 
+# Shared session: keep-alive connections to the API/CDN are reused across searches and downloads
+_SESSION = requests.Session()
+_SESSION.headers.update({"User-Agent": "clipcafe-client/1.0"})
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[500, 502, 503, 504]),
+))
+
+def get_session() -> requests.Session:
+    """
+    The module's pooled session, for callers that want to pass it around explicitly.
+    """
+    return _SESSION
+
+_API_KEY: Optional[str] = None
+
+def refresh_api_key() -> Optional[str]:
+    """
+    (Re)read the API key from the environment; done once at import.
+    """
+    global _API_KEY
+    _API_KEY = os.getenv("CLIPC_CAFE_API_KEY") or os.getenv("API_KEY")
+    return _API_KEY
+
 def get_api_key() -> Optional[str]:
-    return os.getenv("CLIPC_CAFE_API_KEY") or os.getenv("API_KEY")
+    return _API_KEY
+
+refresh_api_key()
 
 def do_search(actor: str, min_duration: int, size: int, offset: int = 0):
     """
     Search clips via clip.cafe API.
     Returns (json, None) on success or (None, error_str) on failure.
     """
-    api_key = get_api_key()
+    api_key = _API_KEY
     if not api_key:
         return None, "CLIPC_CAFE_API_KEY not set. Export it or put in .env."
 
@@ -37,29 +73,67 @@ def do_search(actor: str, min_duration: int, size: int, offset: int = 0):
         "from": offset
     }
     try:
-        r = requests.get(BASE_URL, params=params, timeout=30)
+        r = _SESSION.get(BASE_URL, params=params, timeout=30)
     except Exception as e:
         return None, f"Network/search error: {e}"
     if r.status_code >= 400:
         return None, r.text
     try:
-        return r.json(), None
+        return _loads(r.content), None
     except Exception as e:
         return None, f"Invalid JSON response: {e}"
 
-def download_stream(dl_url: str, out_path: Path, timeout: int = 120) -> Tuple[bool, Optional[str]]:
+def fetch_prefix(dl_url: str, n: int = 1 << 16, timeout: int = 30,
+                 session: Optional[requests.Session] = None) -> Optional[bytes]:
+    """
+    First n bytes of dl_url (HTTP Range; servers that ignore it are cut off after n bytes).
+    The bytes can be handed to download_stream(prefix=...) so they aren't downloaded twice.
+    None on any error.
+    """
+    try:
+        with (session or _SESSION).get(dl_url, stream=True, timeout=timeout,
+                                       headers={"Range": f"bytes=0-{n - 1}", "Accept-Encoding": "identity"}) as r:
+            if r.status_code not in (200, 206):
+                return None
+            return r.raw.read(n, decode_content=True)
+    except Exception:
+        return None
+
+def download_stream(dl_url: str, out_path: Path, timeout: int = 120,
+                    session: Optional[requests.Session] = None,
+                    prefix: Optional[bytes] = None) -> Tuple[bool, Optional[str]]:
     """
     Stream download to a .part and move to final path atomically.
+    The body is pumped with copyfileobj in 1 MiB blocks (C loop, no per-chunk Python work).
+    session: defaults to the shared keep-alive session.
+    prefix: first bytes of the file already fetched (fetch_prefix); only the rest is requested
+    (Range: bytes=len(prefix)-). A server that ignores the Range sends the whole body, which is used as is.
     """
     tmp_file = out_path.with_suffix(".part")
+    headers = {"Range": f"bytes={len(prefix)}-", "Accept-Encoding": "identity"} if prefix else None
     try:
-        with requests.get(dl_url, stream=True, timeout=timeout) as r:
-            r.raise_for_status()
-            with open(tmp_file, "wb") as f:
-                for chunk in r.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-        shutil.move(str(tmp_file), str(out_path))
+        with (session or _SESSION).get(dl_url, stream=True, timeout=timeout, headers=headers) as r:
+            # 416: nothing past the prefix, it already is the whole file
+            whole_prefix = bool(prefix) and r.status_code == 416
+            if not whole_prefix:
+                r.raise_for_status()
+            resumed = bool(prefix) and r.status_code == 206 and \
+                r.headers.get("Content-Range", "").startswith(f"bytes {len(prefix)}-")
+            if prefix and r.status_code == 206 and not resumed:
+                raise ValueError(f"unexpected Content-Range: {r.headers.get('Content-Range')}")
+            r.raw.decode_content = True
+            # copyfileobj already hands over 1 MiB blocks, no need for a second buffer
+            with open(tmp_file, "wb", buffering=0) as f:
+                if whole_prefix or resumed:
+                    f.write(prefix)
+                if not whole_prefix:
+                    shutil.copyfileobj(r.raw, f, length=1 << 20)
+        try:
+            os.replace(tmp_file, out_path)
+        except OSError:
+            # e.g. out_path on another device: copyfile uses sendfile on Linux
+            shutil.copyfile(tmp_file, out_path)
+            tmp_file.unlink()
         return True, None
     except Exception as e:
         try:
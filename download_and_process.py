@@ -9,13 +9,13 @@ Behavior change (kept original CLI variable names):
 - The script now computes the actual video area (after scaling to target width) and places the title
   a fixed gap above that video area. This uses the existing --title-margin-top value as the gap (pixels)
   between the top of the video content and the title text.
-- If pysubs2 is available the title is embedded into the ASS file using an explicit \pos(...) override
-  so positioning is precise. If pysubs2 is missing the drawtext fallback uses a computed y coordinate.
+- The title is embedded into the ASS file (written directly, no pysubs2) using an explicit \pos(...)
+  override so positioning is precise; title and subtitles are rendered in a single libass pass.
 - No CLI variable names changed; semantics of --title-margin-top are now: gap (px) above the video area.
 
 Additional changes:
-- Defaults the font file to "fonts/roboto.ttf". If provided and present, the TTF will be copied into each
-  clip's outputs/<slug>/fonts/ directory and used via subtitles:fontsdir and drawtext:fontfile.
+- Defaults the font file to "fonts/roboto.ttf". If provided and present, the TTF will be linked (hardlink, else symlink, else copy) into each
+  clip's outputs/<slug>/fonts/ directory and used via subtitles:fontsdir.
 - New feature: rounded corners for the central video rectangle. You can set --corner-radius (px).
   The script will generate a per-clip mask PNG (1080x1920) with a white rounded rectangle at the
   computed video area and use ffmpeg's alphamerge+overlay to produce rounded corners.
@@ -27,15 +27,22 @@ from __future__ import annotations
 import os
 import sys
 import json
+import itertools
 import argparse
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pathlib import Path
 import subprocess
 import shutil
 import concurrent.futures
 import time
-from decimal import Decimal, ROUND_HALF_UP
-from typing import Optional, Tuple
+from functools import lru_cache
+from typing import Iterator, Optional, Tuple
+
+from media_utils import safe_filename_from_slug
+from subs_utils import write_ass
+from mask_utils import PNG_FAST
 
 # optional dotenv
 try:
@@ -51,6 +58,29 @@ try:
 except Exception:
     PIL_AVAILABLE = False
 
+# optional orjson: faster subtitles/meta/ffprobe JSON (same output shape as the json fallback)
+try:
+    import orjson
+    _loads = orjson.loads
+    _dumps = lambda o: orjson.dumps(o, option=orjson.OPT_INDENT_2).decode("utf-8")
+except ImportError:
+    _loads = json.loads
+    _dumps = lambda o: json.dumps(o, ensure_ascii=False, indent=2)
+
+# optional NumPy: vectorized mask drawing (PIL is still used to encode the PNG)
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except Exception:
+    NUMPY_AVAILABLE = False
+
+# optional PyAV: read duration/size from the container header without forking ffprobe
+try:
+    import av
+    AV_AVAILABLE = True
+except Exception:
+    AV_AVAILABLE = False
+
 API_KEY = os.getenv("CLIPC_CAFE_API_KEY") or os.getenv("API_KEY")
 if not API_KEY:
     print("Error: CLIPC_CAFE_API_KEY not set. Export it or put in .env.")
@@ -58,7 +88,15 @@ if not API_KEY:
 
 BASE_URL = "https://api.clip.cafe/"
 
+# One session per process: search + downloads reuse keep-alive connections instead of a TLS handshake each
+SESSION = requests.Session()
+SESSION.headers["User-Agent"] = "clipcafe-dl/1"
+SESSION.headers["Accept-Encoding"] = "identity"  # MP4 doesn't compress; skip gzip decode of the body
+SESSION.mount("https://", HTTPAdapter(pool_connections=64, pool_maxsize=64,
+                                      max_retries=Retry(total=3, backoff_factor=0.5)))
+
 # ---------- utilities ----------
+@lru_cache(maxsize=8)  # PATH scan / WinGet stat walk once per (cli arg, env var, exe) per process
 def find_executable(cli_arg_path: Optional[str], env_var: Optional[str], exe_name: str) -> Optional[str]:
     if cli_arg_path:
         p = Path(cli_arg_path)
@@ -94,38 +132,52 @@ def find_ffprobe(cli_arg: Optional[str]) -> Optional[str]:
 def find_ffmpeg(cli_arg: Optional[str]) -> Optional[str]:
     return find_executable(cli_arg, "FFMPEG_PATH", "ffmpeg")
 
-def ffprobe_duration(path: Path, ffprobe_cmd: str) -> Optional[float]:
-    try:
-        cmd = [ffprobe_cmd, "-v", "error", "-show_entries", "format=duration",
-               "-of", "default=noprint_wrappers=1:nokey=1", str(path)]
-        res = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
-        out = res.stdout.strip()
-        return float(out) if out else None
-    except Exception:
-        return None
-
-def ffprobe_video_size(path: Path, ffprobe_cmd: str) -> Optional[Tuple[int,int]]:
+def ffprobe_meta(path: Path, ffprobe_cmd: str) -> Tuple[Optional[float], Optional[Tuple[int,int]]]:
     """
-    Return (width, height) of first video stream using ffprobe, or None on failure.
+    Return (duration, (width, height)) from a single ffprobe call; None for whatever is missing.
     """
     try:
         cmd = [ffprobe_cmd, "-v", "error", "-select_streams", "v:0",
-               "-show_entries", "stream=width,height", "-of", "json", str(path)]
+               "-show_entries", "format=duration:stream=width,height", "-of", "json", str(path)]
         res = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
-        j = json.loads(res.stdout)
-        streams = j.get("streams") or []
-        if not streams:
-            return None
-        s = streams[0]
-        w = int(s.get("width"))
-        h = int(s.get("height"))
-        return (w, h)
+        j = _loads(res.stdout)
     except Exception:
-        return None
+        return None, None
+    try:
+        dur = float((j.get("format") or {}).get("duration"))
+    except (TypeError, ValueError):
+        dur = None
+    size = None
+    streams = j.get("streams") or []
+    if streams:
+        try:
+            size = (int(streams[0].get("width")), int(streams[0].get("height")))
+        except (TypeError, ValueError):
+            size = None
+    return dur, size
+
+def probe_meta(path: Path, ffprobe_cmd: str) -> Tuple[Optional[float], Optional[Tuple[int,int]]]:
+    """
+    Return (duration, (width, height)) with a single PyAV open.
+    Falls back to a single ffprobe call when PyAV is missing or fails.
+    """
+    if AV_AVAILABLE:
+        try:
+            with av.open(str(path)) as c:
+                dur = c.duration / av.time_base if c.duration else None
+                size = None
+                if c.streams.video:
+                    cc = c.streams.video[0].codec_context
+                    size = (int(cc.width), int(cc.height))
+            if dur is not None:
+                return dur, size
+        except Exception:
+            pass
+    return ffprobe_meta(path, ffprobe_cmd)
 
 def decimal_ms(v: float) -> int:
-    d = Decimal(str(v)).quantize(Decimal("0.001"), rounding=ROUND_HALF_UP)
-    return int(d * 1000)
+    # round half away from zero to whole milliseconds (int math, no Decimal per cue boundary)
+    return int(v * 1000 + 0.5) if v >= 0 else -int(-v * 1000 + 0.5)
 
 def float_to_srt_time(f: float) -> str:
     total_ms = decimal_ms(f)
@@ -137,22 +189,12 @@ def float_to_srt_time(f: float) -> str:
     h = total_m // 60
     return f"{h:02d}:{m:02d}:{s:02d},{ms:03d}"
 
-def ffmpeg_escape_text(txt: str) -> str:
-    # Minimal escaping for ffmpeg drawtext usage in a single-quoted string.
-    if not txt:
-        return ""
-    return txt.replace("\\", "\\\\").replace("'", "\\'").replace(":", "\\:").replace("%", "%%")
-
-def ffmpeg_escape_fontfile(path: str) -> str:
-    # Escape backslashes and single-quotes for use inside single-quoted drawtext fontfile=''
-    return path.replace("\\", "\\\\").replace("'", "\\'")
-
 def parse_subs_field(subs_field) -> list[tuple[float, float, str]]:
     if not subs_field:
         return []
     if isinstance(subs_field, str):
         try:
-            data = json.loads(subs_field)
+            data = _loads(subs_field)
         except Exception:
             return []
     else:
@@ -178,87 +220,12 @@ def parse_subs_field(subs_field) -> list[tuple[float, float, str]]:
     return items
 
 def write_srt(items: list[tuple[float, float, str]], out_path: Path) -> Path:
-    lines = []
-    for i, (start, end, text) in enumerate(items, start=1):
-        lines.append(str(i))
-        lines.append(f"{float_to_srt_time(start)} --> {float_to_srt_time(end)}")
-        lines.extend(text.split("\n"))
-        lines.append("")
-    out_path.write_text("\n".join(lines), encoding="utf-8")
+    # one cue at a time straight to the file (no line list / big join)
+    with open(out_path, "w", encoding="utf-8", newline="\n") as f:
+        for i, (start, end, text) in enumerate(items, start=1):
+            f.write(f"{i}\n{float_to_srt_time(start)} --> {float_to_srt_time(end)}\n{text}\n\n")
     return out_path
 
-def safe_filename_from_slug(slug: str) -> str:
-    name = slug.replace("/", "_").replace(" ", "_")
-    return "".join(c for c in name if c.isalnum() or c in "-_.").strip("-_") or f"clip_{int(time.time())}"
-
-# ---------- SRT -> ASS conversion (pysubs2) with Title support ----------
-def generate_ass_from_srt(
-    srt_path: Path,
-    ass_path: Path,
-    font: str,
-    size: int,
-    marginv: int,
-    marginl: int,
-    marginr: int,
-    title_text: Optional[str] = None,
-    title_size: Optional[int] = None,
-    title_pos_y: Optional[int] = None,
-    duration_s: Optional[float] = None
-) -> Tuple[bool, Optional[str]]:
-    """
-    Convert SRT -> ASS and optionally embed a top-centered title (using absolute y coordinate).
-    title_pos_y: if provided, will be used in an ASS override \pos(540, title_pos_y).
-    Returns (True, ass_path) or (False, error_message).
-    """
-    try:
-        import pysubs2
-    except Exception as e:
-        return False, f"pysubs2 not installed: {e}"
-    try:
-        subs = pysubs2.load(str(srt_path))
-        # Default subtitle style (bottom-center)
-        style = subs.styles.get("Default") or pysubs2.SSAStyle()
-        style.fontname = font
-        style.fontsize = size
-        style.alignment = 2  # bottom-center
-        style.marginv = marginv
-        style.marginl = marginl
-        style.marginr = marginr
-        style.outline = style.outline if getattr(style, "outline", None) is not None else 1
-        style.shadow = 0
-        subs.styles["Default"] = style
-
-        # Title style and event (if provided)
-        if title_text:
-            title_style = pysubs2.SSAStyle()
-            title_style.fontname = font
-            title_style.fontsize = title_size if title_size else size
-            title_style.alignment = 8  # top-center (but we'll use \pos for precise placement)
-            # set margins as reasonable defaults (not used when override present)
-            title_style.marginv = 0
-            title_style.marginl = marginl
-            title_style.marginr = marginr
-            title_style.outline = 1
-            title_style.shadow = 0
-            subs.styles["Title"] = title_style
-
-            # create an event that spans the whole clip duration using \pos override for exact y
-            end_ms = int(duration_s * 1000) if duration_s else None
-            pos_y = int(title_pos_y) if title_pos_y is not None else 10
-            # center x = 540 for 1080 width
-            pos_tag = r"{\pos(540," + str(pos_y) + r")}"
-            ev_text = pos_tag + pysubs2.make_esc(title_text)
-            if end_ms:
-                ev = pysubs2.SSAEvent(start=0, end=end_ms, text=ev_text, style="Title")
-            else:
-                ev = pysubs2.SSAEvent(start=0, end=24 * 3600 * 1000, text=ev_text, style="Title")
-            subs.events.insert(0, ev)
-
-        subs.save(str(ass_path))
-        return True, str(ass_path)
-    except Exception as e:
-        return False, f"ASS generation error: {e}"
-
 # ---------- ffmpeg helpers ----------
 def run_ffmpeg(cmd_args: list[str]) -> Tuple[bool, Optional[Exception]]:
     try:
@@ -269,6 +236,72 @@ def run_ffmpeg(cmd_args: list[str]) -> Tuple[bool, Optional[Exception]]:
     except Exception as e:
         return False, e
 
+# Shared codec argv pieces for every output (CRF is appended per output: 23 vertical, 22 feed)
+X264_VARGS = ("-c:v", "libx264", "-preset", "fast", "-tune", "film", "-x264-params", "ref=2:bframes=2")
+AAC_ARGS = ("-c:a", "aac", "-b:a", "128k")
+# moov atom up front: outputs are streamable as uploaded (any encoder)
+MUX_ARGS = ("-movflags", "+faststart")
+
+# Hardware H.264 encoders in preference order (h264_vaapi is left out: it needs -vaapi_device + hwupload)
+HW_ENCODERS = ("h264_nvenc", "h264_qsv", "h264_videotoolbox")
+
+def encoder_works(ffmpeg_cmd: str, encoder: str) -> bool:
+    """
+    Encode a few frames of a generated test pattern to the null muxer with encoder.
+    `ffmpeg -encoders` only lists what the build was compiled with (full Windows builds ship
+    h264_nvenc/h264_qsv); this fails when the machine has no matching GPU/driver.
+    """
+    try:
+        res = subprocess.run(
+            [ffmpeg_cmd, "-hide_banner", "-loglevel", "error",
+             "-f", "lavfi", "-i", "testsrc2=size=256x256:rate=25:duration=0.2",
+             *build_vcodec_args(encoder), "-f", "null", "-"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=30
+        )
+        return res.returncode == 0
+    except Exception:
+        return False
+
+def detect_video_encoder(ffmpeg_cmd: str) -> str:
+    """
+    Return the first hardware encoder (HW_ENCODERS order) that actually encodes on this machine, else libx264.
+    """
+    try:
+        res = subprocess.run([ffmpeg_cmd, "-hide_banner", "-encoders"], stdout=subprocess.PIPE,
+                             stderr=subprocess.STDOUT, text=True, check=True)
+    except Exception:
+        return "libx264"
+    for enc in HW_ENCODERS:
+        if enc in res.stdout and encoder_works(ffmpeg_cmd, enc):
+            return enc
+    return "libx264"
+
+def run_ffmpeg_with_fallback(build_cmd, encoder: str) -> Tuple[bool, Optional[Exception], str]:
+    """
+    run_ffmpeg(build_cmd(encoder)); when a hardware encoder fails at runtime (driver error, session
+    limit, unsupported size) the same command is retried once with libx264.
+    Returns (ok, err, encoder actually used).
+    """
+    ok, err = run_ffmpeg(build_cmd(encoder))
+    if not ok and encoder != "libx264":
+        print(f"Warning: {encoder} encode failed ({err}); retrying with libx264")
+        encoder = "libx264"
+        ok, err = run_ffmpeg(build_cmd(encoder))
+    return ok, err, encoder
+
+def build_vcodec_args(encoder: str, crf: int = 23) -> list[str]:
+    """
+    -c:v plus the matching constant-quality flags for each encoder.
+    """
+    if encoder == "h264_nvenc":
+        return ["-c:v", "h264_nvenc", "-preset", "p5", "-cq", str(crf), "-b:v", "0"]
+    if encoder == "h264_qsv":
+        return ["-c:v", "h264_qsv", "-global_quality", str(crf)]
+    if encoder == "h264_videotoolbox":
+        # -q:v is 1-100 (higher = better) here, not a CRF scale
+        return ["-c:v", "h264_videotoolbox", "-q:v", "65"]
+    return [*X264_VARGS, "-crf", str(crf)]
+
 # ---------- clip.cafe search ----------
 def do_search(actor: str, min_duration: int, size: int, offset: int = 0):
     params = {
@@ -279,7 +312,7 @@ def do_search(actor: str, min_duration: int, size: int, offset: int = 0):
         "from": offset
     }
     try:
-        r = requests.get(BASE_URL, params=params, timeout=30)
+        r = SESSION.get(BASE_URL, params=params, timeout=30)
     except Exception as e:
         return None, f"Network/search error: {e}"
     if r.status_code >= 400:
@@ -290,6 +323,29 @@ def do_search(actor: str, min_duration: int, size: int, offset: int = 0):
         return None, f"Invalid JSON response: {e}"
 
 # ---------- Rounded-corner mask generation ----------
+def _rounded_mask_array(canvas_w: int, canvas_h: int,
+                        rect_x0: int, rect_y0: int, rect_x1: int, rect_y1: int,
+                        radius: int):
+    """
+    uint8 (h, w) array: the rectangle (inclusive coords, like Pillow) filled with 255 by slice
+    assignment, then the four corner tiles cleared outside their quarter circles.
+    """
+    arr = np.zeros((canvas_h, canvas_w), dtype=np.uint8)
+    x1 = min(rect_x1, canvas_w - 1)
+    y1 = min(rect_y1, canvas_h - 1)
+    arr[rect_y0:y1 + 1, rect_x0:x1 + 1] = 255
+    r = min(int(radius), (x1 - rect_x0 + 1) // 2, (y1 - rect_y0 + 1) // 2)
+    if r <= 0:
+        return arr
+    # top-left tile: pixel centers farther than r from the circle center (r, r) are cut
+    yy, xx = np.ogrid[0:r, 0:r]
+    outside = (xx + 0.5 - r) ** 2 + (yy + 0.5 - r) ** 2 > r * r
+    arr[rect_y0:rect_y0 + r, rect_x0:rect_x0 + r][outside] = 0
+    arr[rect_y0:rect_y0 + r, x1 - r + 1:x1 + 1][outside[:, ::-1]] = 0
+    arr[y1 - r + 1:y1 + 1, rect_x0:rect_x0 + r][outside[::-1, :]] = 0
+    arr[y1 - r + 1:y1 + 1, x1 - r + 1:x1 + 1][outside[::-1, ::-1]] = 0
+    return arr
+
 def generate_rounded_mask(mask_path: Path, canvas_w: int, canvas_h: int,
                           rect_x0: int, rect_y0: int, rect_x1: int, rect_y1: int,
                           radius: int) -> bool:
@@ -299,27 +355,72 @@ def generate_rounded_mask(mask_path: Path, canvas_w: int, canvas_h: int,
     """
     if not PIL_AVAILABLE:
         return False
+    if NUMPY_AVAILABLE:
+        try:
+            Image.fromarray(_rounded_mask_array(canvas_w, canvas_h, rect_x0, rect_y0, rect_x1, rect_y1, radius)).save(str(mask_path), **PNG_FAST)
+            return True
+        except Exception:
+            pass
     try:
         img = Image.new("L", (canvas_w, canvas_h), 0)
         draw = ImageDraw.Draw(img)
         # Pillow's rounded_rectangle draws inclusive coordinates, so pass a bbox tuple.
         draw.rounded_rectangle([rect_x0, rect_y0, rect_x1, rect_y1], radius=radius, fill=255)
-        img.save(str(mask_path))
+        img.save(str(mask_path), **PNG_FAST)
         return True
     except Exception:
         return False
 
+def _materialize(src: Path, dst: Path) -> None:
+    """
+    Put src at dst without copying bytes when possible: hardlink, then symlink
+    (e.g. across filesystems), finally a plain copy.
+    """
+    if dst.exists() or dst.is_symlink():
+        dst.unlink()
+    try:
+        os.link(src, dst)
+    except OSError:
+        try:
+            os.symlink(src.resolve(), dst)
+        except OSError:
+            shutil.copy(str(src), str(dst))
+
+# Masks depend only on the video rectangle, which repeats for every clip with the same source aspect:
+# draw each one once into outputs/_masks and link it into the clip dirs
+_MASK_CACHE: dict[tuple, Path] = {}
+
+def cached_rounded_mask(masks_dir: Path, mask_path: Path, canvas_w: int, canvas_h: int,
+                        rect_x0: int, rect_y0: int, rect_x1: int, rect_y1: int,
+                        radius: int) -> bool:
+    key = (canvas_w, canvas_h, rect_x0, rect_y0, rect_x1, rect_y1, radius)
+    shared = _MASK_CACHE.get(key)
+    if shared is None or not shared.exists():
+        shared = masks_dir / f"mask_{canvas_w}x{canvas_h}_{rect_x0}_{rect_y0}_{rect_x1}_{rect_y1}_r{radius}.png"
+        if not shared.exists():
+            # another worker process may be drawing the same mask: write to a private tmp, then rename
+            masks_dir.mkdir(parents=True, exist_ok=True)
+            tmp = masks_dir / f".{shared.stem}.{os.getpid()}.png"
+            if not generate_rounded_mask(tmp, *key):
+                return False
+            os.replace(tmp, shared)
+        _MASK_CACHE[key] = shared
+    try:
+        _materialize(shared, mask_path)
+    except Exception:
+        return False
+    return True
 
 def download_stream(dl_url: str, out_path: Path, timeout: int = 120) -> Tuple[bool, Optional[str]]:
     tmp_file = out_path.with_suffix(".part")
     try:
-        with requests.get(dl_url, stream=True, timeout=timeout) as r:
+        with SESSION.get(dl_url, stream=True, timeout=timeout) as r:
             r.raise_for_status()
+            r.raw.decode_content = True
+            # 1 MiB blocks copied in C instead of a Python loop over 8 KiB chunks
             with open(tmp_file, "wb") as f:
-                for chunk in r.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-        shutil.move(str(tmp_file), str(out_path))
+                shutil.copyfileobj(r.raw, f, length=1 << 20)
+        os.replace(tmp_file, out_path)
         return True, None
     except Exception as e:
         try:
@@ -330,43 +431,63 @@ def download_stream(dl_url: str, out_path: Path, timeout: int = 120) -> Tuple[bo
         return False, str(e)
 
 # ---------- download and process for a single hit ----------
-def process_hit(src: dict, min_duration: int, downloads_dir: Path, outputs_dir: Path,
-                ffprobe_cmd: str, ffmpeg_cmd: str,
-                subtitle_size: int, subtitle_margin: int, side_margin: int,
-                produce_feed: bool, produce_reels: bool, watermark: Optional[Path],
-                title_enable: bool = True, title_text_override: Optional[str] = None,
-                title_size: Optional[int] = None, title_margin_top: int = 80,
-                font_file: Optional[str] = None, font_family: str = "Roboto",
-                corner_radius: int = 0) -> Tuple[bool, dict]:
+def download_hit(src: dict, min_duration: int, downloads_dir: Path, ffprobe_cmd: str) -> Tuple[bool, dict]:
+    """
+    Network half of a hit: meta file, download (or reuse), probe and duration check.
+    Returns (True, {"slug", "video", "meta", "duration", "size"}) or (False, error info).
+    """
     slug_raw = src.get("slug") or src.get("title") or f"clip_{int(time.time())}"
     slug = safe_filename_from_slug(slug_raw)
     out_mp4 = downloads_dir / f"{slug}.mp4"
     meta_file = downloads_dir / f"{slug}.json"
     with open(meta_file, "w", encoding="utf-8") as f:
-        json.dump(src, f, ensure_ascii=False, indent=2)
+        f.write(_dumps(src))
 
     dl = src.get("download")
     if not dl:
         return False, {"error": "no download url", "slug": slug}
 
-    ok, err = download_stream(dl, out_mp4)
-    if not ok:
-        return False, {"error": f"download failed: {err}", "slug": slug}
-
-    # validate duration
-    dur = ffprobe_duration(out_mp4, ffprobe_cmd)
+    # Rerun: a complete earlier download that still probes fine is reused (no network at all).
+    dur = orig_size = None
+    if out_mp4.exists():
+        dur, orig_size = probe_meta(out_mp4, ffprobe_cmd)
     if dur is None:
-        try:
-            out_mp4.unlink()
-        except:
-            pass
-        return False, {"error": "ffprobe missing or failed", "slug": slug}
+        ok, err = download_stream(dl, out_mp4)
+        if not ok:
+            return False, {"error": f"download failed: {err}", "slug": slug}
+
+        # validate duration (size is read from the same probe, used for the layout below)
+        dur, orig_size = probe_meta(out_mp4, ffprobe_cmd)
+        if dur is None:
+            try:
+                out_mp4.unlink()
+            except:
+                pass
+            return False, {"error": "ffprobe missing or failed", "slug": slug}
     if dur < min_duration:
         try:
             out_mp4.unlink()
         except:
             pass
         return False, {"error": f"duration_too_short ({dur})", "slug": slug, "duration": dur}
+    return True, {"slug": slug, "video": out_mp4, "meta": meta_file, "duration": dur, "size": orig_size}
+
+def encode_hit(dl_info: dict, src: dict, downloads_dir: Path, outputs_dir: Path, ffmpeg_cmd: str,
+               subtitle_size: int, subtitle_margin: int, side_margin: int,
+               produce_feed: bool, produce_reels: bool, watermark: Optional[Path],
+               title_enable: bool = True, title_text_override: Optional[str] = None,
+               title_size: Optional[int] = None, title_margin_top: int = 80,
+               font_file: Optional[str] = None, font_family: str = "Roboto",
+               corner_radius: int = 0, ffmpeg_threads: int = 2,
+               video_encoder: str = "libx264") -> Tuple[bool, dict]:
+    """
+    CPU half of a hit: subtitles/title ASS, mask, and the ffmpeg renders of a download_hit result.
+    """
+    slug = dl_info["slug"]
+    out_mp4 = dl_info["video"]
+    meta_file = dl_info["meta"]
+    dur = dl_info["duration"]
+    orig_size = dl_info["size"]
 
     # determine title text
     title_text = None
@@ -377,15 +498,11 @@ def process_hit(src: dict, min_duration: int, downloads_dir: Path, outputs_dir:
             if title_text == "":
                 title_text = None
 
-    # parse subtitles and write SRT
+    # parse subtitles (written as ASS below; SRT only as a fallback)
     subs_field = src.get("subtitles") or src.get("captions") or ""
     subs = parse_subs_field(subs_field) if subs_field else []
     srt_path = downloads_dir / f"{slug}.srt"
     ass_path = downloads_dir / f"{slug}.ass"
-    if subs:
-        write_srt(subs, srt_path)
-    else:
-        srt_path = None
 
     # prepare outputs dir for this clip
     clip_out = outputs_dir / slug
@@ -394,7 +511,7 @@ def process_hit(src: dict, min_duration: int, downloads_dir: Path, outputs_dir:
     feed_out = clip_out / f"{slug}_feed_1080x1080.mp4" if produce_feed else None
     reels_out = clip_out / f"{slug}_reels_1080x1920.mp4" if produce_reels else None
 
-    # Copy font file into clip-local fonts dir (if provided) so libass/ffmpeg can find it via fontsdir
+    # Link font file into clip-local fonts dir (if provided) so libass/ffmpeg can find it via fontsdir
     fonts_dir = None
     if font_file:
         pf = Path(font_file)
@@ -402,7 +519,7 @@ def process_hit(src: dict, min_duration: int, downloads_dir: Path, outputs_dir:
             fonts_dir = clip_out / "fonts"
             fonts_dir.mkdir(parents=True, exist_ok=True)
             try:
-                shutil.copy(str(pf), str(fonts_dir / pf.name))
+                _materialize(pf, fonts_dir / pf.name)
             except Exception:
                 fonts_dir = None
         else:
@@ -412,8 +529,7 @@ def process_hit(src: dict, min_duration: int, downloads_dir: Path, outputs_dir:
     side_margin = max(0, int(side_margin))
     target_width = max(16, 1080 - 2 * side_margin)
 
-    # attempt to read original video size to calculate scaled height
-    orig_size = ffprobe_video_size(out_mp4, ffprobe_cmd)
+    # original video size (from probe_meta above) to calculate scaled height
     if orig_size:
         orig_w, orig_h = orig_size
         # scaled height after scale=target_width:-2
@@ -439,21 +555,28 @@ def process_hit(src: dict, min_duration: int, downloads_dir: Path, outputs_dir:
     # place title baseline slightly above the video_top by gap (ensure not negative)
     title_pos_y = max(6, video_top - gap)
 
-    # Now we attempt to generate ASS (with embedded title positioned at title_pos_y).
+    # Write the ASS (cues + title positioned at title_pos_y) straight from the parsed items:
+    # one libass pass, no drawtext stage, no SRT -> pysubs2 round-trip.
     use_ass = False
-    if srt_path:
-        ass_ok, ass_info = generate_ass_from_srt(
-            srt_path, ass_path, font=font_family,
+    if subs or title_text:
+        ass_ok, ass_info = write_ass(
+            subs, ass_path, font=font_family,
             size=subtitle_size, marginv=subtitle_margin, marginl=side_margin, marginr=side_margin,
-            title_text=title_text if title_text else None,
+            title_text=title_text,
             title_size=title_size if title_size else subtitle_size,
             title_pos_y=title_pos_y,
             duration_s=dur
         )
-        if ass_ok:
-            use_ass = True
+        use_ass = ass_ok
+    if use_ass:
+        srt_path = None
+    else:
+        ass_path = None
+        # fallback: plain SRT rendered with force_style
+        if subs:
+            write_srt(subs, srt_path)
         else:
-            ass_path = None
+            srt_path = None
 
     # Build the base transform (scale->pad->crop) as a filter snippet for filter_complex usage
     base_transform_snippet = (
@@ -462,41 +585,19 @@ def process_hit(src: dict, min_duration: int, downloads_dir: Path, outputs_dir:
         "crop=1080:1920"
     )
 
-    # Prepare drawtext fallback (if ASS not used)
-    drawtext_filter = None
-    if (not use_ass) and title_text:
-        txt = ffmpeg_escape_text(title_text)
-        tsize = title_size if title_size else subtitle_size
-        y_pos = title_pos_y
-        if font_file and Path(font_file).exists():
-            ff_fontfile = ffmpeg_escape_fontfile(Path(font_file).as_posix())
-            drawtext_filter = f"drawtext=fontfile='{ff_fontfile}':text='{txt}':fontsize={tsize}:fontcolor=white:x=(w-text_w)/2:y={y_pos}:box=1:boxcolor=black@0.5:boxborderw=5"
+    # Text filter (appended to every output's base transform) is built once: the path strings and
+    # exists() checks are the same for the vertical and the feed chains
+    fontsdir_opt = f":fontsdir={fonts_dir.as_posix()}" if fonts_dir else ""
+    text_filter = ""
+    if use_ass and ass_path and ass_path.exists():
+        # Use subtitles filter (so fontsdir can be passed)
+        if fonts_dir:
+            text_filter = f",subtitles={ass_path.as_posix()}{fontsdir_opt}"
         else:
-            drawtext_filter = f"drawtext=font='Roboto':text='{txt}':fontsize={tsize}:fontcolor=white:x=(w-text_w)/2:y={y_pos}:box=1:boxcolor=black@0.5:boxborderw=5"
-
-    # Helper to build the video filter chain (applied to [0:v]) before masking/compositing
-    def build_content_filter_chain(base_snippet: str, use_ass_local: bool, ass_path_local: Optional[Path],
-                                   srt_path_local: Optional[Path], drawtext_local: Optional[str],
-                                   fonts_dir_local: Optional[Path], font_family_local: str) -> str:
-        # Returns a filter chain string (no input/output labels) to apply to [0:v]
-        chain = base_snippet
-        # Append drawtext before subtitles/ass so title is part of the content that's masked
-        if drawtext_local:
-            chain += "," + drawtext_local
-        if use_ass_local and ass_path_local and ass_path_local.exists():
-            # Use subtitles filter (so fontsdir can be passed)
-            if fonts_dir_local:
-                chain += f",subtitles={ass_path_local.as_posix()}:fontsdir={fonts_dir_local.as_posix()}"
-            else:
-                chain += f",ass={ass_path_local.as_posix()}"
-        else:
-            if srt_path_local and srt_path_local.exists():
-                force_style = f"FontName={font_family_local},FontSize={subtitle_size},Alignment=2,MarginV={subtitle_margin},PrimaryColour=&H00FFFFFF&,Outline=1,Shadow=0"
-                if fonts_dir_local:
-                    chain += f",subtitles={srt_path_local.as_posix()}:force_style='{force_style}':fontsdir={fonts_dir_local.as_posix()}"
-                else:
-                    chain += f",subtitles={srt_path_local.as_posix()}:force_style='{force_style}'"
-        return chain
+            text_filter = f",ass={ass_path.as_posix()}"
+    elif srt_path and srt_path.exists():
+        force_style = f"FontName={font_family},FontSize={subtitle_size},Alignment=2,MarginV={subtitle_margin},PrimaryColour=&H00FFFFFF&,Outline=1,Shadow=0"
+        text_filter = f",subtitles={srt_path.as_posix()}:force_style='{force_style}'{fontsdir_opt}"
 
     # If corner_radius > 0 and PIL available and scaled dimensions are known, generate mask
     use_mask = False
@@ -518,20 +619,34 @@ def process_hit(src: dict, min_duration: int, downloads_dir: Path, outputs_dir:
         max_radius = min((x1 - x0) // 2, (y1 - y0) // 2)
         radius_use = max(0, min(int(corner_radius), max_radius)) if max_radius > 0 else 0
         if radius_use > 0:
-            if generate_rounded_mask(mask_path, 1080, 1920, x0, y0, x1, y1, radius_use):
+            if cached_rounded_mask(outputs_dir / "_masks", mask_path, 1080, 1920, x0, y0, x1, y1, radius_use):
                 use_mask = True
 
     # Build final ffmpeg invocation for instagram vertical (with mask if available)
-    content_chain = build_content_filter_chain(base_transform_snippet, use_ass, ass_path, srt_path, drawtext_filter, fonts_dir, font_family)
+    content_chain = base_transform_snippet + text_filter
+
+    # 1) instagram post + optional reels (+ watermarked reels): identical 1080x1920 content,
+    #    so decode/filter once and split the result into every output of a single ffmpeg call
+    reels_wm = None
+    if produce_reels and watermark:
+        if not watermark.exists():
+            return False, {"error": f"watermark not found: {watermark}", "slug": slug}
+        reels_wm = clip_out / f"{slug}_reels_wm.mp4"
+    vertical_outs = [(insta_post, "instagram_post")]
+    if produce_reels:
+        vertical_outs.append((reels_out, "reels"))
+    if reels_wm:
+        vertical_outs.append((reels_wm, "reels_wm"))
 
+    inputs = ["-i", str(out_mp4)]
     if use_mask and mask_path.exists():
-        # We'll use filter_complex with two inputs: video and mask
         # Steps:
         #  - [0:v] apply content_chain -> [vsub]
         #  - [1:v] scale to 1080x1920 -> [mask]
         #  - [vsub][mask] alphamerge -> [va]
         #  - color black background -> [bg]
         #  - [bg][va] overlay -> [final]
+        inputs += ["-i", str(mask_path)]
         filter_complex = (
             f"[0:v]{content_chain}[vsub];"
             f"[1:v]scale=1080:1920[mask];"
@@ -539,32 +654,38 @@ def process_hit(src: dict, min_duration: int, downloads_dir: Path, outputs_dir:
             f"color=c=black:s=1080x1920[bg];"
             f"[bg][va]overlay=format=auto[final]"
         )
-        cmd_insta = [
-            ffmpeg_cmd, "-y",
-            "-i", str(out_mp4),
-            "-i", str(mask_path),
-            "-filter_complex", filter_complex,
-            "-map", "[final]",
-            "-map", "0:a?",
-            "-c:v", "libx264", "-preset", "fast", "-crf", "23",
-            "-c:a", "aac", "-b:a", "128k",
-            str(insta_post)
-        ]
     else:
-        # fallback to simple -vf chain (no mask)
-        vf_final = content_chain
-        cmd_insta = [
-            ffmpeg_cmd, "-y",
-            "-i", str(out_mp4),
-            "-vf", vf_final,
-            "-c:v", "libx264", "-preset", "fast", "-crf", "23",
-            "-c:a", "aac", "-b:a", "128k",
-            str(insta_post)
-        ]
+        filter_complex = f"[0:v]{content_chain}[final]"
+
+    out_labels = [f"[o{i}]" for i in range(len(vertical_outs))]
+    if len(vertical_outs) > 1:
+        filter_complex += f";[final]split={len(vertical_outs)}{''.join(out_labels)}"
+    else:
+        out_labels = ["[final]"]
+    if reels_wm:
+        # watermark only on the last split branch (reels_wm)
+        wm_idx = len(inputs) // 2  # inputs is a flat list of "-i", path pairs
+        inputs += ["-i", str(watermark)]
+        filter_complex += f";{out_labels[-1]}[{wm_idx}:v]overlay=10:10[wm]"
+        out_labels[-1] = "[wm]"
+
+    def vertical_cmd(encoder: str) -> list[str]:
+        cmd = [ffmpeg_cmd, "-y", *inputs, "-filter_complex", filter_complex]
+        for (out_path, _), label in zip(vertical_outs, out_labels):
+            cmd += [
+                "-map", label,
+                "-map", "0:a?",
+                *build_vcodec_args(encoder, 23), "-threads", str(ffmpeg_threads),
+                *AAC_ARGS, *MUX_ARGS,
+                str(out_path)
+            ]
+        return cmd
 
-    ok, err = run_ffmpeg(cmd_insta)
+    # after a hardware failure the feed pass below goes straight to libx264
+    ok, err, video_encoder = run_ffmpeg_with_fallback(vertical_cmd, video_encoder)
     if not ok:
-        return False, {"error": f"ffmpeg instagram_post failed: {err}", "slug": slug}
+        names = "/".join(name for _, name in vertical_outs)
+        return False, {"error": f"ffmpeg {names} failed: {err}", "slug": slug}
 
     # 2) optional feed (1080x1080) - NOTE: mask currently applied only to instagram/reels (1080x1920).
     if produce_feed:
@@ -574,67 +695,20 @@ def process_hit(src: dict, min_duration: int, downloads_dir: Path, outputs_dir:
             "pad=width='max(1080,iw)':height='max(1080,ih)':x='(ow-iw)/2':y='(oh-ih)/2':color=black,"
             "crop=1080:1080"
         )
-        # build simple chain for feed with drawtext/subtitles/ass
-        feed_content_chain = build_content_filter_chain(vf_feed, use_ass, ass_path, srt_path, drawtext_filter, fonts_dir, font_family)
-        cmd_feed = [
+        # build simple chain for feed with subtitles/ass
+        feed_content_chain = vf_feed + text_filter
+        feed_cmd = lambda encoder: [
             ffmpeg_cmd, "-y",
             "-i", str(out_mp4),
             "-vf", feed_content_chain,
-            "-c:v", "libx264", "-preset", "fast", "-crf", "22",
-            "-c:a", "aac", "-b:a", "128k",
+            *build_vcodec_args(encoder, 22), "-threads", str(ffmpeg_threads),
+            *AAC_ARGS, *MUX_ARGS,
             str(feed_out)
         ]
-        ok, err = run_ffmpeg(cmd_feed)
+        ok, err, _ = run_ffmpeg_with_fallback(feed_cmd, video_encoder)
         if not ok:
             return False, {"error": f"ffmpeg feed failed: {err}", "slug": slug}
 
-    # 3) optional reels (same as insta_post)
-    if produce_reels:
-        if use_mask and mask_path.exists():
-            # reuse same filter_complex approach as insta_post (mask already scaled for 1080x1920)
-            filter_complex = (
-                f"[0:v]{content_chain}[vsub];"
-                f"[1:v]scale=1080:1920[mask];"
-                f"[vsub][mask]alphamerge[va];"
-                f"color=c=black:s=1080x1920[bg];"
-                f"[bg][va]overlay=format=auto[final]"
-            )
-            cmd_reels = [
-                ffmpeg_cmd, "-y",
-                "-i", str(out_mp4),
-                "-i", str(mask_path),
-                "-filter_complex", filter_complex,
-                "-map", "[final]",
-                "-map", "0:a?",
-                "-c:v", "libx264", "-preset", "fast", "-crf", "23",
-                "-c:a", "aac", "-b:a", "128k",
-                str(reels_out)
-            ]
-        else:
-            vf_reels_final = content_chain
-            cmd_reels = [
-                ffmpeg_cmd, "-y",
-                "-i", str(out_mp4),
-                "-vf", vf_reels_final,
-                "-c:v", "libx264", "-preset", "fast", "-crf", "23",
-                "-c:a", "aac", "-b:a", "128k",
-                str(reels_out)
-            ]
-
-        ok, err = run_ffmpeg(cmd_reels)
-        if not ok:
-            return False, {"error": f"ffmpeg reels failed: {err}", "slug": slug}
-        if watermark:
-            if not watermark.exists():
-                return False, {"error": f"watermark not found: {watermark}", "slug": slug}
-            reels_wm = clip_out / f"{slug}_reels_wm.mp4"
-            cmd_wm = [ffmpeg_cmd, "-y", "-i", str(reels_out), "-i", str(watermark),
-                      "-filter_complex", "overlay=10:10", "-c:v", "libx264", "-preset", "fast", "-crf", "23",
-                      "-c:a", "aac", "-b:a", "128k", str(reels_wm)]
-            ok, err = run_ffmpeg(cmd_wm)
-            if not ok:
-                return False, {"error": f"ffmpeg watermark failed: {err}", "slug": slug}
-
     return True, {
         "slug": slug,
         "duration": dur,
@@ -647,13 +721,32 @@ def process_hit(src: dict, min_duration: int, downloads_dir: Path, outputs_dir:
     }
 
 # ---------- CLI and orchestration ----------
+def iter_candidates(hits: list, min_duration: int) -> Iterator[dict]:
+    """
+    Yield the _source of hits that have a download URL and whose metadata duration
+    (when present) is >= min_duration.
+    """
+    for h in hits:
+        src = h.get("_source", {}) or {}
+        meta_dur = src.get("duration")
+        try:
+            meta_dur_int = int(meta_dur) if meta_dur is not None else None
+        except:
+            meta_dur_int = None
+        if meta_dur_int is not None and meta_dur_int < min_duration:
+            continue
+        if not src.get("download"):
+            continue
+        yield src
+
 def main():
     parser = argparse.ArgumentParser(description="Download clips and produce Instagram-ready vertical posts with bottom-centered subtitles and top title.")
     parser.add_argument("--actor", default="Tom Hardy", help="Actor name to search")
     parser.add_argument("--min-duration", type=int, default=8, help="Minimum clip duration (inclusive)")
     parser.add_argument("--size", type=int, default=100, help="Search size (how many hits to request)")
     parser.add_argument("--offset", type=int, default=0, help="Search offset (pagination)")
-    parser.add_argument("--max-concurrent", type=int, default=3, help="Max concurrent downloads")
+    parser.add_argument("--max-concurrent", type=int, default=20, help="Max concurrent downloads (network-bound, not tied to CPU count)")
+    parser.add_argument("--max-concurrent-encodes", type=int, default=None, help="Max concurrent ffmpeg encodes (default: CPU count)")
     parser.add_argument("--max-total", type=int, default=3, help="Max total clips to download/process")
     parser.add_argument("--downloads-dir", default="downloads", help="Downloads directory")
     parser.add_argument("--outputs-dir", default="outputs", help="Outputs directory")
@@ -672,6 +765,7 @@ def main():
     parser.add_argument("--font-file", default="fonts/roboto.ttf", help="Path to Roboto (TTF) to use directly (default: fonts/roboto.ttf)")
     parser.add_argument("--font-family", default="Roboto", help="Font family name to use in ASS/subtitles (default: Roboto)")
     parser.add_argument("--corner-radius", type=int, default=0, help="Corner radius in pixels for the central video rectangle (0 = no rounding)")
+    parser.add_argument("--video-encoder", default="libx264", choices=["auto", "libx264", *HW_ENCODERS], help="H.264 encoder (auto = first hardware encoder that passes a test encode, else libx264; hardware failures retry with libx264)")
     args = parser.parse_args()
 
     ffprobe_cmd = find_ffprobe(args.ffprobe_path)
@@ -701,6 +795,8 @@ def main():
 
     print("Using ffprobe:", ffprobe_cmd)
     print("Using ffmpeg:", ffmpeg_cmd)
+    video_encoder = detect_video_encoder(ffmpeg_cmd) if args.video_encoder == "auto" else args.video_encoder
+    print("Using video encoder:", video_encoder)
     print(f"Searching for actor='{args.actor}' duration>={args.min_duration}s size={args.size} offset={args.offset}")
 
     js, err = do_search(args.actor, args.min_duration, args.size, offset=args.offset)
@@ -712,52 +808,63 @@ def main():
         print("No hits returned.")
         sys.exit(0)
 
-    # collect candidate hits (metadata duration filter and presence of download URL)
-    candidates = []
-    for h in hits:
-        src = h.get("_source", {}) or {}
-        meta_dur = src.get("duration")
-        try:
-            meta_dur_int = int(meta_dur) if meta_dur is not None else None
-        except:
-            meta_dur_int = None
-        if meta_dur_int is not None and meta_dur_int < args.min_duration:
-            continue
-        if not src.get("download"):
-            continue
-        candidates.append(src)
-        if len(candidates) >= args.max_total:
-            break
+    # collect candidate hits (metadata duration filter and presence of download URL); stops at max_total
+    candidates = list(itertools.islice(iter_candidates(hits, args.min_duration), max(0, args.max_total)))
 
     if not candidates:
         print("No candidate clips found meeting metadata>=min-duration and having download URL.")
         sys.exit(0)
 
-    print(f"Found {len(candidates)} candidate(s). Starting download+process with concurrency={args.max_concurrent}")
+    # Downloads are network-bound and encodes CPU-bound, so they get separate pools: a thread pool
+    # sized by --max-concurrent for downloads and a process pool capped at the CPU count (and the
+    # number of clips) for ffmpeg; encoder threads are split between encode workers so they neither
+    # oversubscribe the CPU nor leave cores idle when there are fewer clips than cores.
+    # Each clip is handed to the encode pool as soon as its download finishes.
+    cpu = os.cpu_count() or 1
+    net_workers = max(1, args.max_concurrent)
+    enc_workers = max(1, min(cpu, args.max_concurrent_encodes or cpu, len(candidates)))
+    ffmpeg_threads = max(1, cpu // enc_workers)
+    print(f"Found {len(candidates)} candidate(s). Starting downloads with concurrency={net_workers}, "
+          f"encodes with concurrency={enc_workers} (ffmpeg -threads {ffmpeg_threads})")
 
     results = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=args.max_concurrent) as exe:
-        futures = []
-        for src in candidates:
-            futures.append(exe.submit(
-                process_hit, src, args.min_duration, downloads_dir, outputs_dir,
-                ffprobe_cmd, ffmpeg_cmd,
+    with concurrent.futures.ThreadPoolExecutor(max_workers=net_workers) as net_exe, \
+            concurrent.futures.ProcessPoolExecutor(max_workers=enc_workers) as enc_exe:
+        dl_futures = {
+            net_exe.submit(download_hit, src, args.min_duration, downloads_dir, ffprobe_cmd): src
+            for src in candidates
+        }
+        enc_futures = []
+        for fut in concurrent.futures.as_completed(dl_futures):
+            try:
+                ok, info = fut.result()
+            except Exception as e:
+                print("Exception in download:", e)
+                continue
+            if not ok:
+                results.append((ok, info))
+                print("FAILED ->", info)
+                continue
+            enc_futures.append(enc_exe.submit(
+                encode_hit, info, dl_futures[fut], downloads_dir, outputs_dir, ffmpeg_cmd,
                 args.subtitle_size, args.subtitle_margin, args.side_margin,
                 args.produce_feed, args.produce_reels, watermark_path,
                 args.title_enable, args.title_text, args.title_size, args.title_margin_top,
-                args.font_file, args.font_family, args.corner_radius
+                args.font_file, args.font_family, args.corner_radius, ffmpeg_threads,
+                video_encoder
             ))
-        for fut in concurrent.futures.as_completed(futures):
+        for fut in concurrent.futures.as_completed(enc_futures):
             try:
                 ok, info = fut.result()
                 results.append((ok, info))
                 if ok:
-                    print("OK ->", json.dumps(info, ensure_ascii=False, indent=2))
+                    sys.stdout.write("OK -> " + json.dumps(info, ensure_ascii=False) + "\n")
                 else:
                     print("FAILED ->", info)
             except Exception as e:
                 print("Exception in worker:", e)
 
+    sys.stdout.flush()
     succ = sum(1 for r in results if r[0])
     fail = len(results) - succ
     print(f"Summary: success={succ}, failed={fail}")
@@ -5,7 +5,6 @@ import sys
 import os
 import json
 import argparse
-import concurrent.futures
 from pathlib import Path
 
 # Ensure local module resolution
@@ -13,8 +12,8 @@ THIS_DIR = os.path.dirname(os.path.abspath(__file__))
 if THIS_DIR not in sys.path:
     sys.path.insert(0, THIS_DIR)
 
-from media_utils import find_ffprobe, find_ffmpeg, nvenc_available  # type: ignore
-from clip_edit_process import edit_clip  # type: ignore
+from media_utils import find_ffprobe, find_ffmpeg, nvenc_available, ffmpeg_threads, ffprobe_info_batch  # type: ignore
+from clip_edit_process import batch_edit  # type: ignore
 
 def main():
     parser = argparse.ArgumentParser(description="Edit downloaded clips; fast rounded frame + optional logo; NVENC supported.")
@@ -85,6 +84,8 @@ def main():
         if not pf.exists():
             print(f"Warning: font file '{args.font_file}' not found. Falling back to system fonts.")
 
+    threads_per_invocation = ffmpeg_threads(args.max_concurrent)
+
     print("Using ffprobe:", ffprobe_cmd)
     print("Using ffmpeg:", ffmpeg_cmd)
 
@@ -104,45 +105,47 @@ def main():
 
     results = []
 
-    def worker(mp4_path: Path, meta_path: Path):
+    def load_meta(meta_path: Path) -> dict:
         try:
             src = json.loads(meta_path.read_text(encoding="utf-8"))
             if not isinstance(src, dict):
                 src = {}
         except Exception:
             src = {}
-        return edit_clip(
-            mp4_path, src, args.min_duration, downloads_dir, outputs_dir,
-            ffprobe_cmd, ffmpeg_cmd,
-            args.subtitle_size, args.subtitle_margin, args.side_margin,
-            args.produce_feed, args.produce_reels, watermark_path,
-            args.title_enable, args.title_text, args.title_size, args.title_margin_top,
-            args.font_file, args.font_family, args.corner_radius,
-            # GPU
-            video_encoder=video_encoder,
-            nvenc_preset=args.nvenc_preset,
-            nvenc_cq=args.nvenc_cq,
-            nvenc_gpu=args.nvenc_gpu,
-            # Logo
-            logo_path=args.logo_path,
-            logo_size_ratio=args.logo_size_ratio,
-            logo_margin=args.logo_margin,
-            logo_opacity=args.logo_opacity,
-        )
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=args.max_concurrent) as exe:
-        futures = [exe.submit(worker, mp4, meta) for mp4, meta in pairs]
-        for fut in concurrent.futures.as_completed(futures):
-            try:
-                ok, info = fut.result()
-                results.append((ok, info))
-                if ok:
-                    print("OK ->", json.dumps(info, ensure_ascii=False, indent=2))
-                else:
-                    print("FAILED ->", info)
-            except Exception as e:
-                print("Exception in worker:", e)
-
+        return src
+
+    # one parallel probe pass (cached on disk by path/mtime/size) instead of a fresh ffprobe per clip
+    probes = ffprobe_info_batch([mp4 for mp4, _ in pairs], ffprobe_cmd, downloads_dir / ".ffprobe_cache.json")
+    clips = [(mp4, load_meta(meta), probes.get(mp4)) for mp4, meta in pairs]
+
+    # Clips are independent: process pool keeps PIL/pysubs2 work off a shared GIL
+    for ok, info in batch_edit(
+        clips, args.min_duration, downloads_dir, outputs_dir,
+        ffprobe_cmd, ffmpeg_cmd,
+        args.subtitle_size, args.subtitle_margin, args.side_margin,
+        args.produce_feed, args.produce_reels, watermark_path,
+        args.title_enable, args.title_text, args.title_size, args.title_margin_top,
+        args.font_file, args.font_family, args.corner_radius,
+        max_workers=args.max_concurrent,
+        # GPU
+        video_encoder=video_encoder,
+        nvenc_preset=args.nvenc_preset,
+        nvenc_cq=args.nvenc_cq,
+        nvenc_gpu=args.nvenc_gpu,
+        threads_per_invocation=threads_per_invocation,
+        # Logo
+        logo_path=args.logo_path,
+        logo_size_ratio=args.logo_size_ratio,
+        logo_margin=args.logo_margin,
+        logo_opacity=args.logo_opacity,
+    ):
+        results.append((ok, info))
+        if ok:
+            sys.stdout.write("OK -> " + json.dumps(info, ensure_ascii=False) + "\n")
+        else:
+            print("FAILED ->", info)
+
+    sys.stdout.flush()
     succ = sum(1 for r in results if r[0])
     fail = len(results) - succ
     print(f"Summary: success={succ}, failed={fail}")
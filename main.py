@@ -1,17 +1,156 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import os
 import sys
 import json
 import time
+import asyncio
 import argparse
 import concurrent.futures
 from pathlib import Path
 from typing import Optional
 
-from clipcafe_client import do_search, download_stream, get_api_key
-from media_utils import find_ffprobe, find_ffmpeg, ffprobe_duration
-from clip_edit_process import edit_clip, safe_filename_from_slug
+from clipcafe_client import do_search, download_stream, fetch_prefix, get_api_key, get_session
+from media_utils import find_ffprobe, find_ffmpeg, ffprobe_info, info_duration, ffmpeg_threads, nvenc_available, mp4_prefix_info, setup_fontconfig
+from clip_edit_process import edit_clip_async, safe_filename_from_slug
+
+def fetch(src: dict, min_duration: int, downloads_dir: Path, ffprobe_cmd: str):
+    """
+    Download one search hit and validate its duration (network stage, runs in a thread via asyncio.to_thread).
+    Returns (True, {"slug", "video", "probe"}) or (False, error info); the probe is reused by edit_clip.
+    """
+    slug_raw = src.get("slug") or src.get("title") or f"clip_{int(time.time())}"
+    slug = safe_filename_from_slug(slug_raw)
+    out_mp4 = downloads_dir / f"{slug}.mp4"
+    meta_file = downloads_dir / f"{slug}.json"
+    try:
+        # sort_keys: a rerun with the same metadata (in any key order) finds identical bytes and skips the write
+        meta_bytes = json.dumps(src, ensure_ascii=False, indent=2, sort_keys=True).encode("utf-8")
+        try:
+            unchanged = meta_file.read_bytes() == meta_bytes
+        except OSError:
+            unchanged = False
+        if not unchanged:
+            meta_file.write_bytes(meta_bytes)
+    except Exception:
+        pass
+
+    dl = src.get("download")
+    if not dl:
+        return False, {"error": "no download url", "slug": slug}
+
+    # download threads share one keep-alive pool (no new TCP/TLS handshake per clip)
+    session = get_session()
+
+    # faststart MP4s carry their duration in the first 64 KiB (moov): reject too-short clips
+    # before downloading them instead of downloading, probing and deleting
+    prefix = fetch_prefix(dl, session=session)
+    pre_dur = info_duration(mp4_prefix_info(prefix)) if prefix else None
+    if pre_dur is not None and pre_dur < min_duration:
+        return False, {"error": f"duration_too_short ({pre_dur})", "slug": slug, "duration": pre_dur}
+
+    # the prefix bytes become the head of the file: only the rest is downloaded
+    ok, err = download_stream(dl, out_mp4, session=session, prefix=prefix)
+    if not ok:
+        return False, {"error": f"download failed: {err}", "slug": slug}
+
+    # validate duration before processing (same as original)
+    probe = ffprobe_info(out_mp4, ffprobe_cmd)
+    dur = info_duration(probe)
+    if dur is None:
+        try:
+            out_mp4.unlink()
+        except:
+            pass
+        return False, {"error": "ffprobe missing or failed", "slug": slug}
+    if dur < min_duration:
+        try:
+            out_mp4.unlink()
+        except:
+            pass
+        return False, {"error": f"duration_too_short ({dur})", "slug": slug, "duration": dur}
+    return True, {"slug": slug, "video": out_mp4, "probe": probe}
+
+def _progress_printer(slug: str):
+    def _show(block: dict) -> None:
+        print(f"[{slug}] {block.get('out_time', '?')} speed={block.get('speed', '?')} ({block.get('progress')})")
+    return _show
+
+async def worker(src: dict, args: argparse.Namespace, downloads_dir: Path, outputs_dir: Path,
+                 ffprobe_cmd: str, ffmpeg_cmd: str, watermark_path: Optional[Path],
+                 video_encoder: str, threads_per_invocation: int,
+                 net_sem: asyncio.Semaphore, enc_slots: asyncio.Queue):
+    """
+    Fetch one clip (blocking HTTP in a thread, at most --max-concurrent at once), then edit it.
+    The encode holds one of enc_slots (its core slice under --pin-cpus, else None) while its ffmpeg
+    runs as an asyncio subprocess, so the event loop thread drives all concurrent encodes.
+    """
+    async with net_sem:
+        ok, info = await asyncio.to_thread(fetch, src, args.min_duration, downloads_dir, ffprobe_cmd)
+    if not ok:
+        return ok, info
+    cpus = await enc_slots.get()
+    try:
+        return await edit_clip_async(
+            info["video"], src, args.min_duration, downloads_dir, outputs_dir,
+            ffprobe_cmd, ffmpeg_cmd,
+            args.subtitle_size, args.subtitle_margin, args.side_margin,
+            args.produce_feed, args.produce_reels, watermark_path,
+            args.title_enable, args.title_text, args.title_size, args.title_margin_top,
+            args.font_file, args.font_family, args.corner_radius,
+            video_encoder=video_encoder,
+            nvenc_preset=args.nvenc_preset,
+            nvenc_cq=args.nvenc_cq,
+            threads_per_invocation=threads_per_invocation,
+            probe=info["probe"],
+            on_progress=_progress_printer(info["slug"]) if args.progress else None,
+            cpus=cpus,
+        )
+    finally:
+        enc_slots.put_nowait(cpus)
+
+def core_slices(n: int) -> list[list[int]]:
+    """
+    Split the cores this process may run on into n disjoint (as far as possible) equal slices.
+    """
+    cores = sorted(os.sched_getaffinity(0))
+    per = max(1, len(cores) // max(1, n))
+    return [[cores[(i * per + j) % len(cores)] for j in range(per)] for i in range(n)]
+
+async def run_all(candidates: list[dict], net_workers: int, enc_workers: int, cpu_slices: Optional[list[list[int]]],
+                  **worker_kwargs) -> list:
+    """
+    Download and encode overlap across clips: each clip is downloaded then handed straight to
+    ffmpeg, so the NIC isn't idle during encodes (nor the CPU during downloads).
+    Results are printed as clips finish.
+    """
+    # to_thread runs fetch and the edit preparation; enough threads that neither stage starves the other
+    asyncio.get_running_loop().set_default_executor(
+        concurrent.futures.ThreadPoolExecutor(max_workers=net_workers + enc_workers)
+    )
+    net_sem = asyncio.Semaphore(net_workers)
+    enc_slots: asyncio.Queue = asyncio.Queue()
+    for i in range(enc_workers):
+        enc_slots.put_nowait(cpu_slices[i] if cpu_slices else None)
+
+    tasks = [
+        asyncio.create_task(worker(src, net_sem=net_sem, enc_slots=enc_slots, **worker_kwargs))
+        for src in candidates
+    ]
+    results = []
+    for fut in asyncio.as_completed(tasks):
+        try:
+            ok, info = await fut
+        except Exception as e:
+            print("Exception in worker:", e)
+            continue
+        results.append((ok, info))
+        if ok:
+            sys.stdout.write("OK -> " + json.dumps(info, ensure_ascii=False) + "\n")
+        else:
+            print("FAILED ->", info)
+    return results
 
 def main():
     parser = argparse.ArgumentParser(description="Download clips and produce Instagram-ready vertical posts with bottom-centered subtitles and top title.")
@@ -20,6 +159,7 @@ def main():
     parser.add_argument("--size", type=int, default=100, help="Search size (how many hits to request)")
     parser.add_argument("--offset", type=int, default=0, help="Search offset (pagination)")
     parser.add_argument("--max-concurrent", type=int, default=3, help="Max concurrent downloads")
+    parser.add_argument("--max-concurrent-encodes", type=int, default=None, help="Max concurrent ffmpeg encodes (default: --max-concurrent)")
     parser.add_argument("--max-total", type=int, default=3, help="Max total clips to download/process")
     parser.add_argument("--downloads-dir", default="downloads", help="Downloads directory")
     parser.add_argument("--outputs-dir", default="outputs", help="Outputs directory")
@@ -38,6 +178,11 @@ def main():
     parser.add_argument("--font-file", default="fonts/roboto.ttf", help="Path to Roboto (TTF) to use directly (default: fonts/roboto.ttf)")
     parser.add_argument("--font-family", default="Roboto", help="Font family name to use in ASS/subtitles (default: Roboto)")
     parser.add_argument("--corner-radius", type=int, default=0, help="Corner radius in pixels for the central video rectangle (0 = no rounding)")
+    parser.add_argument("--hwaccel", choices=["auto", "nvenc", "none"], default="auto", help="NVDEC decode + NVENC encode (auto = when this ffmpeg has h264_nvenc; none = libx264)")
+    parser.add_argument("--nvenc-preset", default="p4", help="NVENC preset (p1 fastest .. p7 best)")
+    parser.add_argument("--nvenc-cq", type=int, default=23, help="NVENC constant quality (used instead of libx264 -crf)")
+    parser.add_argument("--pin-cpus", action="store_true", help="Pin each concurrent ffmpeg encode to a disjoint set of cores (Linux)")
+    parser.add_argument("--progress", action="store_true", help="Print ffmpeg progress (out_time/speed) per clip while encoding")
     args = parser.parse_args()
 
     # API key behavior (same as original): required for main (search).
@@ -65,6 +210,9 @@ def main():
         pf = Path(args.font_file)
         if not pf.exists():
             print(f"Warning: font file '{args.font_file}' not found. The script will fall back to system fonts unless you provide a valid --font-file path.")
+        else:
+            # ffmpeg children inherit FONTCONFIG_FILE: fontconfig only sees the font's own directory
+            setup_fontconfig(pf.parent, downloads_dir / ".fontconfig")
 
     if args.corner_radius and args.corner_radius > 0:
         try:
@@ -74,8 +222,19 @@ def main():
         except Exception:
             pass
 
+    # probe the encoder list once; edit_clip adds -hwaccel cuda and h264_nvenc args when selected
+    use_nvenc = args.hwaccel != "none" and nvenc_available(ffmpeg_cmd)
+    if args.hwaccel == "nvenc" and not use_nvenc:
+        print("Warning: h264_nvenc not usable (missing from this ffmpeg build or no working NVIDIA GPU/driver). Falling back to libx264.")
+    video_encoder = "h264_nvenc" if use_nvenc else "libx264"
+
+    net_workers = max(1, args.max_concurrent)
+    enc_workers = max(1, args.max_concurrent_encodes or args.max_concurrent)
+    threads_per_invocation = ffmpeg_threads(enc_workers)
+
     print("Using ffprobe:", ffprobe_cmd)
     print("Using ffmpeg:", ffmpeg_cmd)
+    print("Using video encoder:", video_encoder)
     print(f"Searching for actor='{args.actor}' duration>={args.min_duration}s size={args.size} offset={args.offset}")
 
     js, err = do_search(args.actor, args.min_duration, args.size, offset=args.offset)
@@ -107,64 +266,23 @@ def main():
         print("No candidate clips found meeting metadata>=min-duration and having download URL.")
         sys.exit(0)
 
-    print(f"Found {len(candidates)} candidate(s). Starting download+process with concurrency={args.max_concurrent}")
-
-    results = []
-    def worker(src: dict):
-        slug_raw = src.get("slug") or src.get("title") or f"clip_{int(time.time())}"
-        slug = safe_filename_from_slug(slug_raw)
-        out_mp4 = downloads_dir / f"{slug}.mp4"
-        meta_file = downloads_dir / f"{slug}.json"
-        try:
-            meta_file.write_text(json.dumps(src, ensure_ascii=False, indent=2), encoding="utf-8")
-        except Exception:
-            pass
-
-        dl = src.get("download")
-        if not dl:
-            return False, {"error": "no download url", "slug": slug}
-
-        ok, err = download_stream(dl, out_mp4)
-        if not ok:
-            return False, {"error": f"download failed: {err}", "slug": slug}
-
-        # validate duration before processing (same as original)
-        dur = ffprobe_duration(out_mp4, ffprobe_cmd)
-        if dur is None:
-            try:
-                out_mp4.unlink()
-            except:
-                pass
-            return False, {"error": "ffprobe missing or failed", "slug": slug}
-        if dur < args.min_duration:
-            try:
-                out_mp4.unlink()
-            except:
-                pass
-            return False, {"error": f"duration_too_short ({dur})", "slug": slug, "duration": dur}
-
-        return edit_clip(
-            out_mp4, src, args.min_duration, downloads_dir, outputs_dir,
-            ffprobe_cmd, ffmpeg_cmd,
-            args.subtitle_size, args.subtitle_margin, args.side_margin,
-            args.produce_feed, args.produce_reels, watermark_path,
-            args.title_enable, args.title_text, args.title_size, args.title_margin_top,
-            args.font_file, args.font_family, args.corner_radius
-        )
+    print(f"Found {len(candidates)} candidate(s). Starting downloads with concurrency={net_workers}, "
+          f"processing with concurrency={enc_workers}")
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=args.max_concurrent) as exe:
-        futures = [exe.submit(worker, src) for src in candidates]
-        for fut in concurrent.futures.as_completed(futures):
-            try:
-                ok, info = fut.result()
-                results.append((ok, info))
-                if ok:
-                    print("OK ->", json.dumps(info, ensure_ascii=False, indent=2))
-                else:
-                    print("FAILED ->", info)
-            except Exception as e:
-                print("Exception in worker:", e)
+    cpu_slices = None
+    if args.pin_cpus:
+        if hasattr(os, "sched_setaffinity"):
+            cpu_slices = core_slices(enc_workers)
+        else:
+            print("Warning: --pin-cpus needs sched_setaffinity (Linux); ignoring.")
+    results = asyncio.run(run_all(
+        candidates, net_workers, enc_workers, cpu_slices,
+        args=args, downloads_dir=downloads_dir, outputs_dir=outputs_dir,
+        ffprobe_cmd=ffprobe_cmd, ffmpeg_cmd=ffmpeg_cmd, watermark_path=watermark_path,
+        video_encoder=video_encoder, threads_per_invocation=threads_per_invocation,
+    ))
 
+    sys.stdout.flush()
     succ = sum(1 for r in results if r[0])
     fail = len(results) - succ
     print(f"Summary: success={succ}, failed={fail}")
@@ -1,14 +1,17 @@
 from __future__ import annotations
 
+from importlib.util import find_spec
 from pathlib import Path
 from typing import Tuple
 
-# optional Pillow
-try:
-    from PIL import Image, ImageDraw
-    PIL_AVAILABLE = True
-except Exception:
-    PIL_AVAILABLE = False
+# optional Pillow / NumPy (NumPy: the window is built with array slicing instead of ImageDraw + putalpha).
+# Only looked up here; imported inside the functions, so --corner-radius 0 runs never load them.
+PIL_AVAILABLE = find_spec("PIL") is not None
+NUMPY_AVAILABLE = find_spec("numpy") is not None
+
+# Stored (uncompressed) PNG: the frame is mostly one solid colour, so zlib would spend its time on
+# bytes ffmpeg inflates again for every clip; a level-0 stream is written and read at memcpy speed.
+PNG_FAST = {"format": "PNG", "compress_level": 0, "optimize": False}
 
 
 def _parse_rgba(color_str: str, alpha: int = 255) -> Tuple[int, int, int, int]:
@@ -31,33 +34,29 @@ def _parse_rgba(color_str: str, alpha: int = 255) -> Tuple[int, int, int, int]:
     return (0, 0, 0, alpha)
 
 
-def generate_rounded_mask(mask_path: Path, canvas_w: int, canvas_h: int,
-                          rect_x0: int, rect_y0: int, rect_x1: int, rect_y1: int,
-                          radius: int) -> bool:
+def _frame_window_rgba(canvas_w: int, canvas_h: int, x0: int, y0: int, x1: int, y1: int,
+                       r: int, bg_rgba: Tuple[int, int, int, int]):
     """
-    Eski yöntem (videoyu alfalı kesmek için): RGBA PNG üretip alfa kanalında içi 255, dışı 0.
-    Artık hızlı yol olarak generate_rounded_frame_window tercih ediliyor.
+    (h, w, 4) uint8 array in one allocation: opaque bg everywhere, alpha 0 inside the rounded
+    rectangle (inclusive coords, like Pillow); the four corner tiles are re-filled outside their
+    quarter circles.
     """
-    if not PIL_AVAILABLE:
-        return False
-    try:
-        img = Image.new("RGBA", (canvas_w, canvas_h), (0, 0, 0, 0))
-        alpha = Image.new("L", (canvas_w, canvas_h), 0)
-        draw = ImageDraw.Draw(alpha)
-        x0, y0 = int(rect_x0), int(rect_y0)
-        x1, y1 = int(rect_x1) - 1, int(rect_y1) - 1
-        x0 = max(0, min(canvas_w - 1, x0))
-        y0 = max(0, min(canvas_h - 1, y0))
-        x1 = max(0, min(canvas_w - 1, x1))
-        y1 = max(0, min(canvas_h - 1, y1))
-        r = max(0, int(radius))
-        draw.rounded_rectangle([x0, y0, x1, y1], radius=r, fill=255)
-        img.putalpha(alpha)
-        mask_path.parent.mkdir(parents=True, exist_ok=True)
-        img.save(str(mask_path))
-        return True
-    except Exception:
-        return False
+    import numpy as np
+
+    arr = np.empty((canvas_h, canvas_w, 4), dtype=np.uint8)
+    arr[...] = bg_rgba
+    alpha = arr[..., 3]
+    alpha[y0:y1 + 1, x0:x1 + 1] = 0
+    r = min(r, (x1 - x0 + 1) // 2, (y1 - y0 + 1) // 2)
+    if r > 0:
+        # top-left tile: pixel centers farther than r from the circle center (r, r) stay opaque
+        yy, xx = np.ogrid[0:r, 0:r]
+        outside = (xx + 0.5 - r) ** 2 + (yy + 0.5 - r) ** 2 > r * r
+        alpha[y0:y0 + r, x0:x0 + r][outside] = 255
+        alpha[y0:y0 + r, x1 - r + 1:x1 + 1][outside[:, ::-1]] = 255
+        alpha[y1 - r + 1:y1 + 1, x0:x0 + r][outside[::-1, :]] = 255
+        alpha[y1 - r + 1:y1 + 1, x1 - r + 1:x1 + 1][outside[::-1, ::-1]] = 255
+    return arr
 
 
 def generate_rounded_frame_window(frame_path: Path,
@@ -71,11 +70,28 @@ def generate_rounded_frame_window(frame_path: Path,
     - Tuval: BG renginde opak
     - Ortadaki yuvarlak dikdörtgen alan: tamamen şeffaf (video bu pencereden görünür)
     Bu sayede ffmpeg'de yalnızca overlay=0:0 ile çok hızlı uygulanır.
+    radius <= 0: köşe yok, çerçeveye gerek yok -> dosya yazmadan True döner (çağıran overlay'i atlar).
     """
+    if not radius or radius <= 0:
+        return True
     if not PIL_AVAILABLE:
         return False
     try:
+        from PIL import Image, ImageDraw
+
         bg_rgba = _parse_rgba(bg_color, 255)
+        if NUMPY_AVAILABLE:
+            x0 = max(0, min(canvas_w - 1, int(rect_x0)))
+            y0 = max(0, min(canvas_h - 1, int(rect_y0)))
+            x1 = max(0, min(canvas_w - 1, int(rect_x1) - 1))
+            y1 = max(0, min(canvas_h - 1, int(rect_y1) - 1))
+            img = Image.fromarray(
+                _frame_window_rgba(canvas_w, canvas_h, x0, y0, x1, y1, max(0, int(radius)), bg_rgba), "RGBA"
+            )
+            frame_path.parent.mkdir(parents=True, exist_ok=True)
+            img.save(str(frame_path), **PNG_FAST)
+            return True
+
         img = Image.new("RGBA", (canvas_w, canvas_h), bg_rgba)
 
         # Şeffaf pencereyi oluşturmak için ayrı bir alfa maskesi hazırlayıp 0'a çekeceğiz
@@ -98,7 +114,22 @@ def generate_rounded_frame_window(frame_path: Path,
         # alfayı uygula
         img.putalpha(alpha)
         frame_path.parent.mkdir(parents=True, exist_ok=True)
-        img.save(str(frame_path))
+        img.save(str(frame_path), **PNG_FAST)
         return True
     except Exception:
-        return False
\ No newline at end of file
+        return False
+
+
+def generate_rounded_mask(mask_path: Path, canvas_w: int, canvas_h: int,
+                          rect_x0: int, rect_y0: int, rect_x1: int, rect_y1: int,
+                          radius: int, bg_color: str = "black") -> bool:
+    """
+    Eski alfa maskesi yöntemi (alphaextract+alphamerge) kaldırıldı; geriye dönük uyumluluk için
+    artık generate_rounded_frame_window ile aynı asset'i üretir (opak BG + şeffaf pencere),
+    böylece ffmpeg tarafında tek yol overlay=0:0 kalır.
+    """
+    if not radius or radius <= 0:
+        return True
+    return generate_rounded_frame_window(
+        mask_path, canvas_w, canvas_h, rect_x0, rect_y0, rect_x1, rect_y1, radius, bg_color=bg_color
+    )
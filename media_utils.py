@@ -1,29 +1,50 @@
 from __future__ import annotations
 
+import io
 import os
+import re
+import time
 import json
 import shutil
+import struct
+import asyncio
 import subprocess
+import concurrent.futures
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Callable, Iterable, Optional, Tuple
 
+# "/" and " " -> "_", then drop anything that isn't alnum/_/-/. (\w keeps non-ASCII letters, like str.isalnum did)
+_SPACE_TRANS = str.maketrans({"/": "_", " ": "_"})
+_SLUG_RE = re.compile(r"[^\w.-]+")
+
+def safe_filename_from_slug(slug: Optional[str]) -> str:
+    """
+    File name stem for a clip.cafe slug (shared by main/editor and both standalone scripts).
+    """
+    return _SLUG_RE.sub("", (slug or "").translate(_SPACE_TRANS)).strip("-_") or f"clip_{int(time.time())}"
+
+@lru_cache(maxsize=None)
 def find_executable(cli_arg_path: Optional[str], env_var: Optional[str], exe_name: str) -> Optional[str]:
+    """
+    Resolve an executable: CLI path (file, or folder holding <exe_name>.exe), env var, PATH,
+    then the Windows WinGet Links folder. Memoized: resolved once per process per argument set.
+    """
     if cli_arg_path:
         p = Path(cli_arg_path)
-        if p.exists():
+        if p.is_file():
             return str(p)
-        if p.is_dir():
-            candidate = p / f"{exe_name}.exe"
-            if candidate.exists():
-                return str(candidate)
+        candidate = p / f"{exe_name}.exe"
+        if candidate.is_file():
+            return str(candidate)
     if env_var:
         env_path = os.environ.get(env_var)
         if env_path:
             p = Path(env_path)
-            if p.exists():
+            if p.is_file():
                 return str(p)
-            candidate = Path(env_path) / f"{exe_name}.exe"
-            if candidate.exists():
+            candidate = p / f"{exe_name}.exe"
+            if candidate.is_file():
                 return str(candidate)
     which = shutil.which(exe_name)
     if which:
@@ -32,33 +53,227 @@ def find_executable(cli_arg_path: Optional[str], env_var: Optional[str], exe_nam
         userprofile = os.environ.get("USERPROFILE")
         if userprofile:
             candidate = Path(userprofile) / "AppData" / "Local" / "Microsoft" / "WinGet" / "Links" / f"{exe_name}.exe"
-            if candidate.exists():
+            if candidate.is_file():
                 return str(candidate)
     return None
 
+# ffmpeg/ffprobe launches: with close_fds=False (and an absolute executable path, as find_executable
+# returns) CPython starts the child with posix_spawn instead of fork+exec, so a parent with a large RSS
+# (Pillow, subtitles) doesn't pay for copying its page tables per launch. Python-created fds are
+# non-inheritable anyway (PEP 446). Windows keeps the default.
+_CLOSE_FDS = os.name == "nt"
+
 def find_ffprobe(cli_arg: Optional[str]) -> Optional[str]:
     return find_executable(cli_arg, "FFPROBE_PATH", "ffprobe")
 
 def find_ffmpeg(cli_arg: Optional[str]) -> Optional[str]:
     return find_executable(cli_arg, "FFMPEG_PATH", "ffmpeg")
 
-def ffprobe_duration(path: Path, ffprobe_cmd: str) -> Optional[float]:
+def ffprobe_info(path: Path, ffprobe_cmd: str) -> Optional[dict]:
+    """
+    Single ffprobe call (-show_format -show_streams, JSON) for a media file
+    (MP4s are read from the moov header instead, see mp4_header_info).
+    Results are memoized per (path, mtime) so the duration/size lookups done
+    along the pipeline share one ffprobe process per clip.
+    """
+    try:
+        mtime_ns = path.stat().st_mtime_ns
+    except OSError:
+        return None
+    return _ffprobe_info_cached(str(path), mtime_ns, ffprobe_cmd)
+
+# ---------- MP4 header fast path ----------
+# Duration (mvhd) and coded video size (stsd sample entry) of an MP4/MOV, parsed from the moov box
+# in-process; saves an ffprobe fork/exec + libavformat init per clip. Anything unexpected -> None,
+# and the caller falls back to ffprobe.
+_MOOV_MAX_BYTES = 64 << 20
+
+def _iter_boxes(buf: bytes, start: int, end: int):
+    pos = start
+    while pos + 8 <= end:
+        size, typ = struct.unpack_from(">I4s", buf, pos)
+        hdr = 8
+        if size == 1:
+            if pos + 16 > end:
+                return
+            size = struct.unpack_from(">Q", buf, pos + 8)[0]
+            hdr = 16
+        elif size == 0:
+            size = end - pos
+        if size < hdr or pos + size > end:
+            return
+        yield typ, pos + hdr, pos + size
+        pos += size
+
+def _child(buf: bytes, start: int, end: int, typ: bytes) -> Optional[Tuple[int, int]]:
+    for t, s, e in _iter_boxes(buf, start, end):
+        if t == typ:
+            return s, e
+    return None
+
+def _read_moov(f, file_size: int) -> Optional[bytes]:
+    pos = 0
+    while pos + 8 <= file_size:
+        f.seek(pos)
+        head = f.read(16)
+        if len(head) < 8:
+            return None
+        size, typ = struct.unpack_from(">I4s", head)
+        if pos == 0 and typ != b"ftyp":
+            return None
+        hdr = 8
+        if size == 1:
+            if len(head) < 16:
+                return None
+            size = struct.unpack_from(">Q", head, 8)[0]
+            hdr = 16
+        elif size == 0:
+            size = file_size - pos
+        if size < hdr:
+            return None
+        if typ == b"moov":
+            if size > _MOOV_MAX_BYTES:
+                return None
+            f.seek(pos)
+            moov = f.read(size)
+            return moov if len(moov) == size else None
+        pos += size
+    return None
+
+def _trak_video_size(buf: bytes, start: int, end: int) -> Optional[Tuple[int, int]]:
+    mdia = _child(buf, start, end, b"mdia")
+    if not mdia:
+        return None
+    hdlr = _child(buf, *mdia, b"hdlr")
+    if not hdlr or buf[hdlr[0] + 8:hdlr[0] + 12] != b"vide":
+        return None
+    box = mdia
+    for typ in (b"minf", b"stbl", b"stsd"):
+        box = _child(buf, *box, typ)
+        if not box:
+            return None
+    # stsd: version/flags + entry count, then the first sample entry (avc1/hvc1/...):
+    # 8 header + 6 reserved + 2 data ref + 16 pre_defined/reserved, then u16 width, u16 height
+    entry = box[0] + 8
+    if entry + 36 > box[1]:
+        return None
+    w, h = struct.unpack_from(">HH", buf, entry + 32)
+    return (w, h) if w and h else None
+
+def mp4_header_info(path_str: str) -> Optional[dict]:
+    """
+    ffprobe-shaped {"format": {"duration"}, "streams": [{"codec_type": "video", "width", "height"}]}
+    read straight from the MP4 header, or None when the file isn't a parseable MP4/MOV.
+    """
+    try:
+        with open(path_str, "rb") as f:
+            return _moov_info(_read_moov(f, os.fstat(f.fileno()).st_size))
+    except OSError:
+        return None
+
+def mp4_prefix_info(prefix: bytes) -> Optional[dict]:
+    """
+    Same as mp4_header_info for the first bytes of a download (e.g. an HTTP Range request);
+    only works for faststart files, where moov comes before mdat.
+    """
+    return _moov_info(_read_moov(io.BytesIO(prefix), len(prefix)))
+
+def _moov_info(moov: Optional[bytes]) -> Optional[dict]:
+    try:
+        if not moov:
+            return None
+        boxes = list(_iter_boxes(moov, 0, len(moov)))
+        if not boxes:
+            return None
+        _, mstart, mend = boxes[0]
+        duration = size = None
+        for typ, s, e in _iter_boxes(moov, mstart, mend):
+            if typ == b"mvhd":
+                if moov[s] == 1:
+                    timescale, dur = struct.unpack_from(">IQ", moov, s + 20)
+                    unknown = dur == 0xFFFFFFFFFFFFFFFF
+                else:
+                    timescale, dur = struct.unpack_from(">II", moov, s + 12)
+                    unknown = dur == 0xFFFFFFFF
+                if timescale and dur and not unknown:
+                    duration = dur / timescale
+            elif typ == b"trak" and size is None:
+                size = _trak_video_size(moov, s, e)
+        if duration is None or size is None:
+            return None
+        return {
+            "format": {"duration": f"{duration:.6f}"},
+            "streams": [{"codec_type": "video", "width": size[0], "height": size[1]}],
+        }
+    except (struct.error, IndexError):
+        return None
+
+@lru_cache(maxsize=256)
+def _ffprobe_info_cached(path_str: str, mtime_ns: int, ffprobe_cmd: str) -> Optional[dict]:
+    info = mp4_header_info(path_str)
+    if info is not None:
+        return info
+    try:
+        cmd = [ffprobe_cmd, "-v", "error", "-print_format", "json",
+               "-show_format", "-show_streams", path_str]
+        res = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True,
+                             close_fds=_CLOSE_FDS)
+        return json.loads(res.stdout)
+    except Exception:
+        return None
+
+def ffprobe_info_batch(paths: Iterable[Path], ffprobe_cmd: str,
+                       cache_file: Optional[Path] = None, max_workers: int = 8) -> dict[Path, Optional[dict]]:
+    """
+    ffprobe_info for many files: misses run in a thread pool (overlaps the per-process startup),
+    and with cache_file results are kept on disk keyed by (path, mtime_ns, size), so re-runs
+    over an unchanged downloads dir spawn no ffprobe at all.
+    """
+    cache: dict = {}
+    if cache_file is not None:
+        try:
+            cache = json.loads(cache_file.read_text(encoding="utf-8"))
+        except Exception:
+            cache = {}
+    keys: dict[Path, Optional[str]] = {}
+    for p in paths:
+        try:
+            st = p.stat()
+            keys[p] = f"{p.resolve()}|{st.st_mtime_ns}|{st.st_size}"
+        except OSError:
+            keys[p] = None
+    result: dict[Path, Optional[dict]] = {p: cache.get(k) if k else None for p, k in keys.items()}
+    missing = [p for p, k in keys.items() if k and k not in cache]
+    if missing:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, max_workers)) as exe:
+            for p, info in zip(missing, exe.map(lambda p: ffprobe_info(p, ffprobe_cmd), missing)):
+                result[p] = info
+                if info is not None:
+                    cache[keys[p]] = info
+        if cache_file is not None:
+            # drop stale entries (older mtime/size of a scanned file, or files that are gone)
+            live = {k for k in keys.values() if k}
+            scanned = {k.rsplit("|", 2)[0] for k in live}
+            cache = {k: v for k, v in cache.items()
+                     if k in live or (k.rsplit("|", 2)[0] not in scanned and Path(k.rsplit("|", 2)[0]).exists())}
+            tmp = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+            try:
+                tmp.write_text(json.dumps(cache), encoding="utf-8")
+                os.replace(tmp, cache_file)
+            except OSError:
+                pass
+    return result
+
+def info_duration(info: Optional[dict]) -> Optional[float]:
     try:
-        cmd = [ffprobe_cmd, "-v", "error", "-show_entries", "format=duration",
-               "-of", "default=noprint_wrappers=1:nokey=1", str(path)]
-        res = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
-        out = res.stdout.strip()
+        out = str((info or {}).get("format", {}).get("duration") or "").strip()
         return float(out) if out else None
     except Exception:
         return None
 
-def ffprobe_video_size(path: Path, ffprobe_cmd: str) -> Optional[Tuple[int,int]]:
+def info_video_size(info: Optional[dict]) -> Optional[Tuple[int,int]]:
     try:
-        cmd = [ffprobe_cmd, "-v", "error", "-select_streams", "v:0",
-               "-show_entries", "stream=width,height", "-of", "json", str(path)]
-        res = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
-        j = json.loads(res.stdout)
-        streams = j.get("streams") or []
+        streams = [s for s in (info or {}).get("streams") or [] if s.get("codec_type") == "video"]
         if not streams:
             return None
         s = streams[0]
@@ -68,29 +283,152 @@ def ffprobe_video_size(path: Path, ffprobe_cmd: str) -> Optional[Tuple[int,int]]
     except Exception:
         return None
 
+def ffprobe_duration(path: Path, ffprobe_cmd: str) -> Optional[float]:
+    return info_duration(ffprobe_info(path, ffprobe_cmd))
+
+def ffprobe_video_size(path: Path, ffprobe_cmd: str) -> Optional[Tuple[int,int]]:
+    return info_video_size(ffprobe_info(path, ffprobe_cmd))
+
 def run_ffmpeg(cmd_args: list[str]):
     try:
-        subprocess.run(cmd_args, check=True)
+        subprocess.run(cmd_args, check=True, close_fds=_CLOSE_FDS)
         return True, None
     except subprocess.CalledProcessError as e:
         return False, e
     except Exception as e:
         return False, e
 
+async def run_ffmpeg_async(cmd_args: list[str], on_progress: Optional[Callable[[dict], None]] = None,
+                           cpus: Optional[list[int]] = None):
+    """
+    run_ffmpeg as an asyncio subprocess (the event loop waits on it, no thread per encode).
+    on_progress: called with each `-progress pipe:1` block (out_time, fps, speed, progress=continue/end).
+    cpus: pin the ffmpeg process to these cores right after it is spawned (Linux).
+    """
+    if on_progress is not None:
+        cmd_args = [cmd_args[0], "-progress", "pipe:1", "-nostats", *cmd_args[1:]]
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd_args,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE if on_progress is not None else None,
+            close_fds=_CLOSE_FDS,
+        )
+    except Exception as e:
+        return False, e
+    if cpus and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(proc.pid, cpus)
+        except OSError:
+            pass
+    if on_progress is not None:
+        block: dict = {}
+        async for raw in proc.stdout:
+            key, sep, val = raw.decode("utf-8", "replace").strip().partition("=")
+            if not sep:
+                continue
+            block[key] = val
+            if key == "progress":
+                try:
+                    on_progress(block)
+                except Exception:
+                    pass
+                block = {}
+    rc = await proc.wait()
+    if rc != 0:
+        return False, subprocess.CalledProcessError(rc, cmd_args)
+    return True, None
+
+def ffmpeg_threads(n_outer: int = 1) -> int:
+    """
+    Thread budget for one ffmpeg process when n_outer of them run side by side,
+    so encoders/filters don't oversubscribe the cores.
+    CLIPCAFE_FFMPEG_THREADS overrides the computed value.
+    """
+    env_val = os.getenv("CLIPCAFE_FFMPEG_THREADS")
+    if env_val:
+        try:
+            return max(1, int(env_val))
+        except ValueError:
+            pass
+    return max(1, (os.cpu_count() or 1) // max(1, int(n_outer)))
+
+def setup_fontconfig(font_dir: Path, conf_dir: Path) -> Optional[Path]:
+    """
+    Write a minimal fonts.conf that only lists font_dir (plus a private cache dir) and point
+    FONTCONFIG_FILE at it, so fontconfig inside every ffmpeg launch (libass, drawtext font=)
+    scans one directory instead of the whole system font tree.
+    The file is only rewritten when its content changes; fc-cache (when present) builds the cache once.
+    An existing FONTCONFIG_FILE is left alone. Returns the conf path or None.
+    """
+    if os.getenv("FONTCONFIG_FILE"):
+        return None
+    try:
+        conf_dir.mkdir(parents=True, exist_ok=True)
+        conf_path = conf_dir / "fonts.conf"
+        esc = lambda p: str(p.resolve()).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+        conf = (
+            '<?xml version="1.0"?>\n'
+            '<!DOCTYPE fontconfig SYSTEM "fonts.dtd">\n'
+            "<fontconfig>\n"
+            f"  <dir>{esc(font_dir)}</dir>\n"
+            f"  <cachedir>{esc(conf_dir / 'cache')}</cachedir>\n"
+            "</fontconfig>\n"
+        ).encode("utf-8")
+        try:
+            unchanged = conf_path.read_bytes() == conf
+        except OSError:
+            unchanged = False
+        if not unchanged:
+            conf_path.write_bytes(conf)
+    except OSError:
+        return None
+    os.environ["FONTCONFIG_FILE"] = str(conf_path.resolve())
+    os.environ["FONTCONFIG_PATH"] = str(conf_dir.resolve())
+    fc_cache = shutil.which("fc-cache")
+    if fc_cache:
+        try:
+            subprocess.run([fc_cache, str(font_dir)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                           close_fds=_CLOSE_FDS, timeout=60)
+        except Exception:
+            pass
+    return conf_path
+
+# one-pass escaping tables (str.translate maps each char to its escaped form)
+_ESC_TEXT = str.maketrans({"\\": "\\\\", "'": "\\'", ":": "\\:", "%": "%%"})
+_ESC_FONTFILE = str.maketrans({"\\": "\\\\", "'": "\\'"})
+
 def ffmpeg_escape_text(txt: str) -> str:
     if not txt:
         return ""
-    return txt.replace("\\", "\\\\").replace("'", "\\'").replace(":", "\\:").replace("%", "%%")
+    return txt.translate(_ESC_TEXT)
 
 def ffmpeg_escape_fontfile(path: str) -> str:
-    return path.replace("\\", "\\\\").replace("'", "\\'")
+    return path.translate(_ESC_FONTFILE)
 
+@lru_cache(maxsize=8)
 def nvenc_available(ffmpeg_cmd: str) -> bool:
     """
-    Returns True if h264_nvenc encoder is available in this ffmpeg build.
+    Returns True if h264_nvenc is in this ffmpeg build and actually encodes on this machine.
+    Full builds list h264_nvenc without an NVIDIA GPU/driver, so a listed encoder is confirmed
+    with a few frames of a test pattern encoded to the null muxer.
+    Cached per ffmpeg_cmd: both checks run once per process.
     """
     try:
-        res = subprocess.run([ffmpeg_cmd, "-hide_banner", "-encoders"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, check=True)
-        return "h264_nvenc" in res.stdout
+        with subprocess.Popen([ffmpeg_cmd, "-hide_banner", "-encoders"], stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, text=True, close_fds=_CLOSE_FDS) as proc:
+            # scan line by line (no full-output string), but read to the end: only a clean exit counts
+            found = False
+            for line in proc.stdout:
+                found = found or "h264_nvenc" in line
+            if not (found and proc.wait() == 0):
+                return False
+        res = subprocess.run(
+            [ffmpeg_cmd, "-hide_banner", "-loglevel", "error",
+             "-f", "lavfi", "-i", "testsrc2=size=256x256:rate=25:duration=0.2",
+             "-c:v", "h264_nvenc", "-f", "null", "-"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=30, close_fds=_CLOSE_FDS
+        )
+        return res.returncode == 0
     except Exception:
         return False
\ No newline at end of file
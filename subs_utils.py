@@ -3,21 +3,16 @@ from __future__ import annotations
 import json
 import time
 from pathlib import Path
-from decimal import Decimal, ROUND_HALF_UP
 from typing import Optional, Tuple
 
 def decimal_ms(v: float) -> int:
-    d = Decimal(str(v)).quantize(Decimal("0.001"), rounding=ROUND_HALF_UP)
-    return int(d * 1000)
+    # round half away from zero to whole milliseconds (int math, no Decimal per cue boundary)
+    return int(v * 1000 + 0.5) if v >= 0 else -int(-v * 1000 + 0.5)
 
 def float_to_srt_time(f: float) -> str:
-    total_ms = decimal_ms(f)
-    ms = total_ms % 1000
-    total_s = total_ms // 1000
-    s = total_s % 60
-    total_m = total_s // 60
-    m = total_m % 60
-    h = total_m // 60
+    total_s, ms = divmod(decimal_ms(f), 1000)
+    total_m, s = divmod(total_s, 60)
+    h, m = divmod(total_m, 60)
     return f"{h:02d}:{m:02d}:{s:02d},{ms:03d}"
 
 def parse_subs_field(subs_field) -> list[tuple[float, float, str]]:
@@ -60,6 +55,78 @@ def write_srt(items: list[tuple[float, float, str]], out_path: Path) -> Path:
     out_path.write_text("\n".join(lines), encoding="utf-8")
     return out_path
 
+# Direct ASS writer: generate_ass_from_srt's pysubs2 output has no PlayRes, so libass renders it in a
+# 384x288 space and every size/margin/outline was tuned there; they are scaled to the 1080x1920 PlayRes
+# below (x by 1080/384, y by 1920/288) so the burned-in look stays the same. Only the title \pos is
+# canvas pixels (the layout computes title_pos_y on the 1080x1920 canvas).
+_LEGACY_PLAYRES_X = 384
+_LEGACY_PLAYRES_Y = 288
+
+def _ass_time(v: float) -> str:
+    cs = int(max(0.0, v) * 100 + 0.5)
+    return f"{cs // 360000}:{cs // 6000 % 60:02d}:{cs // 100 % 60:02d}.{cs % 100:02d}"
+
+def _ass_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("{", "\\{").replace("}", "\\}").replace("\n", "\\N")
+
+def write_ass(
+    items: list[tuple[float, float, str]],
+    ass_path: Path,
+    *,
+    font: str,
+    size: int,
+    marginv: int,
+    marginl: int,
+    marginr: int,
+    title_text: Optional[str] = None,
+    title_size: Optional[int] = None,
+    title_pos_y: Optional[int] = None,
+    duration_s: Optional[float] = None
+) -> Tuple[bool, Optional[str]]:
+    """
+    Write parse_subs_field items + optional title (\pos(540, title_pos_y)) straight to a 1080x1920
+    ASS script (no SRT round-trip, no pysubs2). Returns (True, ass_path) or (False, error_message).
+    """
+    kx, ky = 1080 / _LEGACY_PLAYRES_X, 1920 / _LEGACY_PLAYRES_Y
+    style_fmt = "Style: {name},{font},{size},&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,{outline},0,{align},{ml},{mr},{mv},1\n"
+    try:
+        with open(ass_path, "w", encoding="utf-8", newline="\n") as f:
+            f.write(
+                "[Script Info]\n"
+                "ScriptType: v4.00+\n"
+                "PlayResX: 1080\n"
+                "PlayResY: 1920\n"
+                "WrapStyle: 0\n"
+                "ScaledBorderAndShadow: yes\n"
+                "\n"
+                "[V4+ Styles]\n"
+                "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, "
+                "Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, "
+                "Alignment, MarginL, MarginR, MarginV, Encoding\n"
+            )
+            # outline 2 = pysubs2's SSAStyle default that the old SRT -> ASS path kept; the title had outline 1
+            f.write(style_fmt.format(name="Default", font=font, size=round(size * ky), outline=round(2 * ky), align=2,
+                                     ml=round(marginl * kx), mr=round(marginr * kx), mv=round(marginv * ky)))
+            if title_text:
+                f.write(style_fmt.format(name="Title", font=font, size=round((title_size or size) * ky),
+                                         outline=round(ky), align=8,
+                                         ml=round(marginl * kx), mr=round(marginr * kx), mv=0))
+            f.write(
+                "\n"
+                "[Events]\n"
+                "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n"
+            )
+            if title_text:
+                end = duration_s if duration_s else 24 * 3600
+                pos_y = int(title_pos_y) if title_pos_y is not None else 10
+                f.write(f"Dialogue: 0,{_ass_time(0)},{_ass_time(end)},Title,,0,0,0,,"
+                        f"{{\\pos(540,{pos_y})}}{_ass_escape(title_text)}\n")
+            for start, end, text in items:
+                f.write(f"Dialogue: 0,{_ass_time(start)},{_ass_time(end)},Default,,0,0,0,,{_ass_escape(text)}\n")
+        return True, str(ass_path)
+    except Exception as e:
+        return False, f"ASS write error: {e}"
+
 def generate_ass_from_srt(
     srt_path: Path,
     ass_path: Path,
@@ -75,6 +142,7 @@ def generate_ass_from_srt(
 ) -> Tuple[bool, Optional[str]]:
     """
     Convert SRT -> ASS and optionally embed a top-centered title (using absolute y coordinate).
+    Kept for callers that only have an SRT file; structured subs should go through write_ass.
     title_pos_y: if provided, will be used in an ASS override \pos(540, title_pos_y).
     Returns (True, ass_path) or (False, error_message).
     """